@@ -1,16 +1,156 @@
-from flask import Flask, request, redirect, url_for
+from flask import Flask, g, has_request_context, request, redirect, url_for, stream_with_context
+from werkzeug.http import is_resource_modified
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 import markdown
-import json
+import builtins
+import functools
+import itertools
+import hashlib
+import re
+import time
+import sys
 import os
 from sqlalchemy import or_, and_
-from datetime import datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from calendar_index import CalendarIndex
+from converter import Converter, converter as table_converter
+from cache import LRUCache
+from compression import available_encodings, choose_encoding, compress
+from encoder import JSONProvider, join_object, join_map, pack, msgpack_available
+from snapshot import Snapshot, write_snapshot
+from migrations import analyze, migrate
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Gauge, Stage, finish_request, instrument_engine, \
+    record_import, registry as metrics_registry, server_timing, set_enabled as set_metrics_enabled, start_request
+from artifact_loader import Artifact, ArtifactDay, find_artifacts, iter_artifacts
+from export import EVENT_TYPES, ExportOptions, Reiterable, buffered, emit, parse_event_types, \
+    EXTENSIONS as EXPORT_EXTENSIONS, MEDIA_TYPES as EXPORT_MEDIA_TYPES
+from database import ReadReplicas, RoutingSession, engine_options, insert_ignore, read_engine, set_query_only, \
+    set_statement_timeout
+from vectorized import VectorEngine, numpy_available
+from search import SearchIndex, SearchResult, like_to_regex
+from typing import Iterator, NamedTuple, Optional
 
-db = SQLAlchemy()
+try:
+    import fcntl
+except ImportError:
+    # Windows, concurrent bootstraps are not serialized there
+    fcntl = None
+
+IMPORT_BATCH_SIZE: int = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+ARTIFACT_WORKERS: int = int(os.environ.get('ARTIFACT_WORKERS', 0))
+DAY_CACHE_SIZE: int = int(os.environ.get('DAY_CACHE_SIZE', 8192))
+RESPONSE_CACHE_SIZE: int = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+RESPONSE_MAX_AGE: int = int(os.environ.get('RESPONSE_MAX_AGE', 3600))
+USE_SNAPSHOT: bool = bool(int(os.environ.get('USE_SNAPSHOT', 1)))
+QUERY_ENGINE: str = os.environ.get('QUERY_ENGINE', 'sql').lower()
+MAX_BATCH_QUERIES: int = int(os.environ.get('MAX_BATCH_QUERIES', 100))
+MAX_SEARCH_RESULTS: int = int(os.environ.get('MAX_SEARCH_RESULTS', 500))
+STREAM_BATCH_SIZE: int = int(os.environ.get('STREAM_BATCH_SIZE', 64))
+JSON_ENCODER: str = os.environ.get('JSON_ENCODER', 'auto').lower()
+COMPRESSION: bool = bool(int(os.environ.get('COMPRESSION', 1)))
+COMPRESS_MIN_SIZE: int = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESSED_CACHE_MB: int = int(os.environ.get('COMPRESSED_CACHE_MB', 64))
+DATABASE_URI: str = os.environ.get('DATABASE_URI', 'sqlite:///calendar.db')
+DATABASE_REPLICAS: list[str] = [
+    uri.strip() for uri in os.environ.get('DATABASE_REPLICAS', '').split(',')
+    if uri.strip()
+]
+DB_POOL_SIZE: int = int(os.environ.get('DB_POOL_SIZE', 0))
+DB_POOL_RECYCLE: int = int(os.environ.get('DB_POOL_RECYCLE', -1))
+DB_STATEMENT_TIMEOUT: float = float(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+TIMEZONE: str = os.environ.get('TIMEZONE', '')
+METRICS: bool = bool(int(os.environ.get('METRICS', 1)))
+SERVER_TIMING: bool = bool(int(os.environ.get('SERVER_TIMING', 0)))
+ARTIFACTS_DIR: str = os.environ.get(
+    'ARTIFACTS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts')
+)
+DAY_FIELDS: tuple[str, ...] = (
+    'date', 'event', 'panchangam', 'public_holiday', 'tithi'
+)
+MEDIA_TYPES: dict[str, str] = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'msgpack': 'application/msgpack',
+}
+# Stay below SQLite's default limit of 32766 variables per statement
+MAX_BOUND_PARAMETERS: int = 30000
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+read_replicas: ReadReplicas = ReadReplicas()
+calendar_index: CalendarIndex = None
+# Month table corrected with the imported days, see load_converter()
+converter: Converter = table_converter
+vector_engine: VectorEngine = None
+search_index: SearchIndex = None
+day_fragments: LRUCache = LRUCache(maxsize=DAY_CACHE_SIZE)
+encoded_days: LRUCache = LRUCache(maxsize=DAY_CACHE_SIZE)
+response_cache: LRUCache = LRUCache(maxsize=RESPONSE_CACHE_SIZE)
+compressed_cache: LRUCache = LRUCache(
+    maxsize=RESPONSE_CACHE_SIZE * len(available_encodings())
+    if COMPRESSED_CACHE_MB > 0 else 0,
+    maxbytes=COMPRESSED_CACHE_MB * 1024 * 1024
+)
+CACHES: dict[str, LRUCache] = {
+    'response': response_cache,
+    'compressed': compressed_cache,
+    'day_fragments': day_fragments,
+    'encoded_days': encoded_days,
+}
+for metric in (
+        Gauge('npeventsapi_cache_hits_total', 'Lookups answered by a cache',
+              lambda: [((name,), cache.hits) for name, cache in CACHES.items()],
+              labels=('cache',), kind='counter'),
+        Gauge('npeventsapi_cache_misses_total', 'Lookups missing a cache',
+              lambda: [((name,), cache.misses) for name, cache in CACHES.items()],
+              labels=('cache',), kind='counter'),
+        Gauge('npeventsapi_cache_hit_ratio', 'Share of lookups answered by a cache',
+              lambda: [
+                  ((name,), cache.hits / max(cache.hits + cache.misses, 1))
+                  for name, cache in CACHES.items()
+              ], labels=('cache',)),
+        Gauge('npeventsapi_cache_entries', 'Entries held by a cache',
+              lambda: [((name,), len(cache)) for name, cache in CACHES.items()],
+              labels=('cache',))):
+    metrics_registry.add(metric)
+# Server-Timing headers need the stage timings even without /metrics
+set_metrics_enabled(METRICS or SERVER_TIMING)
+try:
+    timezone: Optional[ZoneInfo] = ZoneInfo(TIMEZONE) if TIMEZONE else None
+except (ZoneInfoNotFoundError, ValueError):
+    print(f'[W] Unknown time zone "{TIMEZONE}", using the time zone of the server')
+    timezone = None
 app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///calendar.db"
+try:
+    app.json = JSONProvider(app, encoder=JSON_ENCODER)
+except ValueError as e:
+    print(f'[W] {e}, using the default one')
+    app.json = JSONProvider(app)
+app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+    DATABASE_URI, pool_size=DB_POOL_SIZE, pool_recycle=DB_POOL_RECYCLE,
+    statement_timeout=DB_STATEMENT_TIMEOUT
+)
+app.config["SQLALCHEMY_BINDS"] = {
+    f'replica-{number}': {
+        'url': uri,
+        **engine_options(
+            uri, pool_size=DB_POOL_SIZE, pool_recycle=DB_POOL_RECYCLE,
+            statement_timeout=DB_STATEMENT_TIMEOUT
+        )
+    }
+    for number, uri in enumerate(DATABASE_REPLICAS)
+}
 db.init_app(app)
+with app.app_context():
+    for bind_key, bind_engine in db.engines.items():
+        set_statement_timeout(bind_engine, DB_STATEMENT_TIMEOUT)
+        if METRICS or SERVER_TIMING:
+            instrument_engine(bind_engine)
+        if bind_key is not None:
+            # Replicas are never written to, not even by mistake
+            set_query_only(bind_engine)
 
 
 class Calendar(db.Model):
@@ -25,12 +165,19 @@ class Calendar(db.Model):
     bs_day = db.Column(db.Integer, unique=False, nullable=False)
     is_holiday = db.Column(db.Boolean, unique=False, nullable=False,
                            default=False)
+    __table_args__ = (
+        db.Index('ix_calendar_ad_date', 'ad_year', 'ad_month', 'ad_day'),
+        db.Index('ix_calendar_bs_date', 'bs_year', 'bs_month', 'bs_day'),
+    )
 
 
 class Events(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     event_name = db.Column(db.Unicode, unique=False, nullable=False)
     event_class = db.Column(db.String, unique=False, nullable=False)
+    __table_args__ = (
+        db.Index('ix_events_class_name', 'event_class', 'event_name'),
+    )
 
 
 class CalendarEventRelationship(db.Model):
@@ -43,80 +190,301 @@ class CalendarEventRelationship(db.Model):
                              lazy=True)
     dates = db.relationship('Calendar', backref='CalendarEventRelationship',
                             lazy=True)
+    # A unique index rather than a constraint, SQLite can add it to an
+    # existing table
+    __table_args__ = (
+        db.Index('uq_relationship_day_event', 'day_id', 'event_id',
+                 unique=True),
+        db.Index('ix_relationship_event_day', 'event_id', 'day_id'),
+    )
+
+
+class ArtifactManifest(db.Model):
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    size = db.Column(db.Integer, unique=False, nullable=False)
+    mtime_ns = db.Column(db.Integer, unique=False, nullable=False)
+    sha256 = db.Column(db.String(64), unique=False, nullable=False)
+    # UTC without offset, the column keeps no time zone on every database
+    imported_at = db.Column(db.DateTime, unique=False, nullable=False)
 
 
 class CalendarQueryException(Exception):
     pass
 
 
-def get_days_on(caltype: str, year: int, month: int):
-    dbc = db.select(Calendar).filter(
-        getattr(Calendar, f'{caltype}_year') == year,
-        getattr(Calendar, f'{caltype}_month') == month
-    ).order_by(
-        getattr(Calendar, f'{caltype}_day').desc()
+class CalendarQuery(NamedTuple):
+    caltype: str
+    sn_range: Optional[tuple[int, int]]
+    year: int
+    month: int
+    day: int
+    only_holidays: bool
+    except_holidays: bool
+    filter_tithis: tuple[str, ...]
+    search_event: str
+
+
+def export_snapshot(path: str) -> int:
+    """
+    Writes every day and its events from the database to a snapshot file
+    :param path: Snapshot file path, replaced atomically
+    :return: Size of the snapshot in bytes
+    """
+    day_events: dict[int, list[tuple[str, str]]] = {}
+    tithis: dict[int, str] = {}
+    for day_id, event_class, event_name in db.session.execute(
+            db.select(
+                CalendarEventRelationship.day_id,
+                Events.event_class, Events.event_name
+            ).join(Events, CalendarEventRelationship.event_id == Events.id)
+            .order_by(CalendarEventRelationship.id)):
+        if event_class == 'tithi':
+            tithis[day_id] = event_name
+        else:
+            day_events.setdefault(day_id, []).append((event_class, event_name))
+    temp_path: str = f'{path}.{os.getpid()}.tmp'
+    size: int = write_snapshot(temp_path, (
+        (day_id, ad_sn, bs_sn, is_holiday, tithis.get(day_id),
+         day_events.get(day_id, []))
+        for day_id, ad_sn, bs_sn, is_holiday in db.session.execute(
+            db.select(
+                Calendar.id, Calendar.ad_sn, Calendar.bs_sn, Calendar.is_holiday
+            )
+        )
+    ))
+    os.replace(temp_path, path)
+    return size
+
+
+def load_snapshot(version: str) -> Snapshot:
+    """
+    Maps the snapshot of the given dataset version, exporting it first if
+    it does not exist yet. Snapshots of older versions are removed.
+    :param version: Dataset version
+    :return: Snapshot
+    """
+    path: str = os.path.join(app.instance_path, f'calendar-{version}.snapshot')
+    if not os.path.exists(path):
+        os.makedirs(app.instance_path, exist_ok=True)
+        size: int = export_snapshot(path)
+        print(f'[I] Exported calendar snapshot "{path}" ({size} bytes)')
+        for file in os.listdir(app.instance_path):
+            if file.startswith('calendar-') and file.endswith('.snapshot') \
+                    and file != os.path.basename(path):
+                os.remove(os.path.join(app.instance_path, file))
+    return Snapshot(path)
+
+
+def load_calendar_index() -> CalendarIndex:
+    manifest: list[ArtifactManifest] = db.session.execute(
+        db.select(ArtifactManifest).order_by(ArtifactManifest.year)
+    ).scalars().all()
+    # Databases seeded with SKIP_DB_CREATE have no manifest to go by
+    version: str = hashlib.sha256(
+        ';'.join(f'{entry.year}:{entry.sha256}' for entry in manifest).encode()
+        if manifest else str(db.session.execute(
+            db.select(db.func.count(Calendar.id))
+        ).scalar()).encode()
+    ).hexdigest()[:32]
+    last_modified: Optional[datetime] = max(
+        (entry.imported_at.replace(tzinfo=dt_timezone.utc) for entry in manifest),
+        default=None
     )
-    result = db.session.execute(dbc).first()
-    return getattr(result[0], f'{caltype}_day')
+    if USE_SNAPSHOT:
+        snapshot: Snapshot = load_snapshot(version)
+        return CalendarIndex(
+            version=version, last_modified=last_modified, snapshot=snapshot
+        )
+    return CalendarIndex(
+        db.session.execute(
+            db.select(
+                Calendar.id, Calendar.ad_sn, Calendar.bs_sn,
+                Calendar.ad_year, Calendar.ad_month, Calendar.ad_day,
+                Calendar.bs_year, Calendar.bs_month, Calendar.bs_day,
+                Calendar.is_holiday
+            )
+        ).all(),
+        version=version, last_modified=last_modified
+    )
+
+
+def get_calendar_index() -> CalendarIndex:
+    """
+    Returns the in-memory calendar index, loading it on first use
+    :return: Calendar index
+    """
+    global calendar_index
+    if calendar_index is None:
+        calendar_index = load_calendar_index()
+        load_converter(calendar_index)
+    return calendar_index
+
+
+def load_converter(index: CalendarIndex) -> None:
+    """
+    Corrects the converter's month table with the imported days, so dates
+    are validated and converted the way the days are served. Months the
+    table gets wrong are reported and taken from the days
+    :param index: Calendar index of the imported days
+    :return:
+    """
+    global converter
+    converter, disagreements = table_converter.corrected(index)
+    for disagreement in disagreements:
+        print(f'[W] {disagreement}')
+
+
+def get_vector_engine() -> Optional[VectorEngine]:
+    """
+    Returns the NumPy query engine when QUERY_ENGINE=numpy is usable
+    :return: Engine over the current snapshot or None to query SQL
+    """
+    global vector_engine
+    if QUERY_ENGINE != 'numpy' or not numpy_available():
+        return None
+    index: CalendarIndex = get_calendar_index()
+    if index.snapshot is None:
+        return None
+    engine: VectorEngine = vector_engine
+    if engine is None or engine.snapshot is not index.snapshot:
+        engine = vector_engine = VectorEngine(index.snapshot)
+    return engine
+
+
+def get_search_index() -> Optional[SearchIndex]:
+    """
+    Returns the event search index of the current snapshot
+    :return: Search index or None when snapshots are disabled
+    """
+    global search_index
+    index: CalendarIndex = get_calendar_index()
+    if index.snapshot is None:
+        return None
+    events: SearchIndex = search_index
+    if events is None or events.snapshot is not index.snapshot:
+        events = search_index = SearchIndex(index.snapshot)
+    return events
+
+
+def invalidate_calendar_index() -> None:
+    global calendar_index, vector_engine, search_index
+    calendar_index = None
+    vector_engine = None
+    search_index = None
+    day_fragments.clear()
+    encoded_days.clear()
+    response_cache.clear()
+    compressed_cache.clear()
+
+
+def days_in_month(caltype: str, year: int, month: int) -> Optional[int]:
+    """
+    Number of days in a month, computed by the converter so months that are
+    not imported are validated too. BS years newer than the converter's
+    table fall back to the month lengths of the calendar index
+    :param caltype: Calendar system, 'ad' or 'bs'
+    :param year: Year
+    :param month: Month
+    :return: Days in the month or None if the month is not known
+    """
+    return converter.days_in_month(caltype, year, month) \
+        or get_calendar_index().days_in_month(caltype, year, month)
+
+
+def local_now() -> datetime:
+    """
+    :return: Current time in TIMEZONE, or in the time zone of the server
+    """
+    return datetime.now(timezone).replace(tzinfo=None)
 
 
 def get_today(caltype: str):
-    y = datetime.now().year
-    m = datetime.now().month
-    d = datetime.now().day
-    if caltype == 'ad':
-        return f'{y}-{m}-{d}'
-    elif caltype == 'bs':
-        dbc = db.select(Calendar).filter(
-            Calendar.ad_year == y,
-            Calendar.ad_month == m,
-            Calendar.ad_day == d
-        )
-        r = db.session.execute(dbc).first()
-        return f'{r[0].bs_year}-{r[0].bs_month}-{r[0].bs_day}'
+    """
+    Today's date, resolved once per request so every calendar variable of
+    a request expands to the same day, even around midnight
+    :param caltype: Calendar system, 'ad' or 'bs'
+    :return: Date as "yyyy-m-d"
+    """
+    caltype = caltype.lower()
+    todays: dict[str, str] = g.setdefault('today', {}) if has_request_context() else {}
+    if caltype not in todays:
+        now: datetime = local_now()
+        y, m, d = now.year, now.month, now.day
+        if caltype == 'bs':
+            y, m, d = converter.convert('ad', y, m, d) \
+                or get_calendar_index().convert('ad', y, m, d)
+        todays[caltype] = f'{y}-{m}-{d}'
+    return todays[caltype]
 
 
-def calendar_var_replace(caltype: str, string: str) -> str:
+@Stage('variables')
+def calendar_var_replace(caltype: str, string: str,
+                         today: str = None) -> str:
+    if '@' not in string:
+        return string
+    if today is None:
+        today = get_today(caltype=caltype)
     string = string.replace(
-        '@today', get_today(caltype=caltype)
+        '@today', today
     )
     string = string.replace(
         '@ignore', '0'
     )
     string = string.replace(
-        '@cur_year', get_today(caltype=caltype).split('-')[0]
+        '@cur_year', today.split('-')[0]
     )
     string = string.replace(
-        '@cur_month', get_today(caltype=caltype).split('-')[1]
+        '@cur_month', today.split('-')[1]
     )
     string = string.replace(
-        '@cur_day', get_today(caltype=caltype).split('-')[2]
+        '@cur_day', today.split('-')[2]
     )
     return string
 
 
-def calender_query_builder(caltype: str, start: tuple[int, int, int],
-                           only_holidays: bool = False,
-                           except_holidays: bool = False,
-                           filter_tithis: list[str] = [],
-                           end: tuple[int, int, int] = (0, 1, 1),
-                           search_event: str = ''):
+def parse_date_param(caltype: str, string: str,
+                     today: str = None) -> tuple[int, int, int]:
+    """
+    Parses a date parameter such as "2080-1", "@today" or "@cur_year-5"
+    :param caltype: Calendar the date is in
+    :param string: Date parameter
+    :param today: Today's date in caltype, looked up when not given
+    :return: (year, month, day), missing parts are 0
+    """
+    chunks: list[int] = [
+        int(chunk)
+        for chunk in
+        calendar_var_replace(caltype=caltype, string=string, today=today)
+        .split('-')
+        if chunk.strip() != ''
+    ]
+    if len(chunks) == 0 or len(chunks) > 3:
+        raise ValueError(f'"{string}" is not a date')
+    return (
+        chunks[0],
+        chunks[1] if len(chunks) >= 2 else 0,
+        chunks[2] if len(chunks) >= 3 else 0
+    )
+
+
+@Stage('validate')
+def parse_calendar_query(caltype: str, start: tuple[int, int, int],
+                         only_holidays: bool = False,
+                         except_holidays: bool = False,
+                         filter_tithis: list[str] = [],
+                         end: tuple[int, int, int] = (0, 1, 1),
+                         search_event: str = '') -> CalendarQuery:
     filter_tithis = [
         item for item in filter_tithis if item.strip() != ''
     ]
-    calendar = db.select(Calendar) \
-        .join(
-        CalendarEventRelationship,
-        Calendar.id == CalendarEventRelationship.day_id
-    ) \
-        .group_by(Calendar.id) \
-        .join(Events, CalendarEventRelationship.event_id == Events.id)
     if caltype not in ['ad', 'bs']:
         raise CalendarQueryException(f'Unspported calendar type \'{caltype}\'')
     if end[0] > start[0] and end[0] == 0:
         raise CalendarQueryException(
             'End date is ahead of start date, cannot compute'
         )
+    sn_range: tuple[int, int] = None
+    year, month, day = 0, 0, 0
     if end[0] != 0:
         start_y, start_m, start_d = start[0], start[1], start[2]
         end_y, end_m, end_d = end[0], end[1], end[2]
@@ -130,8 +498,10 @@ def calender_query_builder(caltype: str, start: tuple[int, int, int],
                 f'For range start use "0" to select first month of the year '
                 f'and for range end use "0" to select last month of the year !'
             )
-        start_d_data = get_days_on(caltype, start_y, start_m)
-        end_d_data = get_days_on(caltype, end_y, end_m)
+        # Ends in BS years unknown to the converter only bound the range,
+        # any day of such a month is accepted
+        start_d_data: int = days_in_month(caltype, start_y, start_m) or 32
+        end_d_data: int = days_in_month(caltype, end_y, end_m) or 32
         # Validate day
         if (0 <= start_d <= start_d_data) \
                 or (0 <= end_d <= end_d_data):
@@ -147,22 +517,14 @@ def calender_query_builder(caltype: str, start: tuple[int, int, int],
                 f'has "{end_d_data}" For start range use "0" to select '
                 f'first day of month and for range end use "0" to select '
                 f'last day of month !')
-        calendar = calendar.filter(
-            getattr(Calendar, f'{caltype}_sn').between(
-                int(f'{start_y}{start_m:02d}{start_d:02d}'),
-                int(f'{end_y}{end_m:02d}{end_d:02d}'
-                    )
-            )
+        sn_range = (
+            int(f'{start_y}{start_m:02d}{start_d:02d}'),
+            int(f'{end_y}{end_m:02d}{end_d:02d}')
         )
     else:
-        if start[0] != 0:
-            calendar = calendar.where(
-                getattr(Calendar, f'{caltype}_year') == start[0]
-            )
+        year = start[0]
         if start[1] > 0 and start[1] <= 12:
-            calendar = calendar.where(
-                getattr(Calendar, f'{caltype}_month') == start[1]
-            )
+            month = start[1]
         else:
             if start[1] != 0:
                 raise CalendarQueryException(
@@ -171,13 +533,12 @@ def calender_query_builder(caltype: str, start: tuple[int, int, int],
                     f'between "1" and "12" !')
         day_in_month = 31
         if start[1] != 0:
-            day_in_month = get_days_on(
+            # BS months unknown to the converter keep 31, the query then finds nothing
+            day_in_month = days_in_month(
                 caltype=caltype, year=start[0], month=start[1]
-            )
+            ) or 31
         if start[2] > 0 and start[2] <= day_in_month:
-            calendar = calendar.where(
-                getattr(Calendar, f'{caltype}_day') == start[2]
-            )
+            day = start[2]
         else:
             if start[2] != 0:
                 raise CalendarQueryException(
@@ -185,71 +546,739 @@ def calender_query_builder(caltype: str, start: tuple[int, int, int],
                     f'Use "0" to select all days or use anything '
                     f'between "1" and "{day_in_month}" for the month!'
                 )
-    if only_holidays:
+    return CalendarQuery(
+        caltype=caltype, sn_range=sn_range, year=year, month=month, day=day,
+        only_holidays=only_holidays, except_holidays=except_holidays,
+        filter_tithis=tuple(filter_tithis), search_event=search_event
+    )
+
+
+def calender_query_builder(caltype: str, start: tuple[int, int, int],
+                           only_holidays: bool = False,
+                           except_holidays: bool = False,
+                           filter_tithis: list[str] = [],
+                           end: tuple[int, int, int] = (0, 1, 1),
+                           search_event: str = ''):
+    query: CalendarQuery = parse_calendar_query(
+        caltype=caltype, start=start, only_holidays=only_holidays,
+        except_holidays=except_holidays, filter_tithis=filter_tithis,
+        end=end, search_event=search_event
+    )
+    calendar = db.select(Calendar) \
+        .join(
+        CalendarEventRelationship,
+        Calendar.id == CalendarEventRelationship.day_id
+    ) \
+        .group_by(Calendar.id) \
+        .join(Events, CalendarEventRelationship.event_id == Events.id)
+    if query.sn_range is not None:
+        calendar = calendar.filter(
+            getattr(Calendar, f'{caltype}_sn').between(*query.sn_range)
+        )
+    for part in ('year', 'month', 'day'):
+        if getattr(query, part) != 0:
+            calendar = calendar.where(
+                getattr(Calendar, f'{caltype}_{part}') == getattr(query, part)
+            )
+    if query.only_holidays:
         calendar = calendar.filter(Calendar.is_holiday == 1)
-    if except_holidays:
+    if query.except_holidays:
         calendar = calendar.filter(Calendar.is_holiday == 0)
-    if len(filter_tithis) > 0:
+    if len(query.filter_tithis) > 0:
         calendar = calendar.filter(
-            Events.event_class == 'tithi', Events.event_name.in_(filter_tithis)
+            Events.event_class == 'tithi',
+            Events.event_name.in_(query.filter_tithis)
         )
-    if search_event.strip() != '':
-        calendar = calendar.filter(Events.event_name.like(search_event))
+    if query.search_event.strip() != '':
+        events: SearchIndex = get_search_index()
+        if events is None:
+            calendar = calendar.filter(
+                Events.event_name.like(query.search_event)
+            )
+        elif len(query.filter_tithis) > 0:
+            # The same tithi event has to match the search as well
+            expression: re.Pattern = like_to_regex(query.search_event)
+            calendar = calendar.filter(Events.event_name.in_([
+                name for name in query.filter_tithis
+                if expression.fullmatch(name)
+            ]))
+        else:
+            # Days with a matching event come from the search index, this
+            # replaces a LIKE scan over every joined row
+            positions: tuple[int, ...] = events.days_like(query.search_event)
+            calendar = calendar.filter(Calendar.id.in_(
+                [events.snapshot.ids[pos] for pos in positions]
+                if len(positions) <= MAX_BOUND_PARAMETERS else
+                db.select(Calendar.id).join(
+                    CalendarEventRelationship,
+                    Calendar.id == CalendarEventRelationship.day_id
+                ).join(
+                    Events, CalendarEventRelationship.event_id == Events.id
+                ).where(Events.event_name.like(query.search_event))
+            ))
     return calendar
 
 
+@Stage('query')
+def find_calendar_days(**query_args) -> list:
+    """
+    Runs a calendar query on the configured engine
+    :param query_args: Arguments of calender_query_builder
+    :return: Rows whose first item is the matching day
+    """
+    engine: VectorEngine = get_vector_engine()
+    if engine is not None:
+        index: CalendarIndex = get_calendar_index()
+        return [
+            (index[pos],)
+            for pos in engine.select(parse_calendar_query(**query_args))
+        ]
+    return db.session.execute(calender_query_builder(**query_args)).all()
+
+
+def iter_calendar_days(batch_size: int = STREAM_BATCH_SIZE,
+                       **query_args) -> Iterator[list]:
+    """
+    Runs a calendar query like find_calendar_days, but hands the matching
+    days out in batches as they are read from the cursor. Invalid queries
+    raise CalendarQueryException when the first batch is requested.
+    :param batch_size: Maximum number of days per batch
+    :param query_args: Arguments of calender_query_builder
+    :return: Iterator over lists of days
+    """
+    engine: VectorEngine = get_vector_engine()
+    if engine is not None:
+        index: CalendarIndex = get_calendar_index()
+        positions: list[int] = engine.select(parse_calendar_query(**query_args))
+        for batch in chunked(positions, batch_size):
+            yield [index[pos] for pos in batch]
+        return None
+    query = calender_query_builder(**query_args)
+    # The session of the request is closed before a streamed response is
+    # complete, so the cursor gets a connection of its own
+    with (read_engine() or db.engine).connect() as connection:
+        result = connection.execution_options(yield_per=batch_size) \
+            .execute(query)
+        for partition in result.partitions():
+            yield list(partition)
+
+
+def stream_calendar_days(fields: Optional[tuple[str, ...]] = None,
+                         **query_args):
+    """
+    Streams the days matching a query as newline delimited JSON, one day
+    payload per line. Only one batch of days is held in memory at a time,
+    so memory use and the time to the first byte do not grow with the range.
+    :param fields: Parts of the day payloads to include, None for all
+    :param query_args: Arguments of calender_query_builder
+    :return: Streamed response, or an error when nothing matches
+    """
+    batches: Iterator[list] = iter_calendar_days(**query_args)
+    # Read the first batch up front to answer empty results with a 404
+    first: list = next(batches, None)
+    if first is None:
+        return {'error': 'No data found for date !'}, 404
+
+    def generate() -> Iterator[bytes]:
+        batch: list = first
+        while batch is not None:
+            yield b''.join(
+                encoded + b'\n'
+                for encoded in load_encoded_days(batch, fields)
+            )
+            batch = next(batches, None)
+
+    return app.response_class(
+        stream_with_context(generate()), mimetype=MEDIA_TYPES['ndjson']
+    )
+
+
+def build_day_fragment(day: Calendar, events: list[tuple[str, str]],
+                       fields: tuple[str, ...] = DAY_FIELDS) -> dict:
+    fragment: dict = {}
+    if 'tithi' in fields:
+        fragment['tithi'] = ''
+    if 'event' in fields:
+        fragment['event'] = []
+    if 'panchangam' in fields:
+        fragment['panchangam'] = []
+    if 'date' in fields:
+        fragment['date'] = {
+            'ad': {
+                'year': day.ad_year,
+                'month': day.ad_month,
+                'day': day.ad_day,
+            },
+            'bs': {
+                'year': day.bs_year,
+                'month': day.bs_month,
+                'day': day.bs_day,
+            },
+        }
+    if 'public_holiday' in fields:
+        fragment['public_holiday'] = day.is_holiday
+    for event_class, event_name in events:
+        if event_class not in fragment:
+            continue
+        if event_class == 'tithi':
+            fragment['tithi'] = event_name
+        else:
+            fragment[event_class].append(event_name)
+    return fragment
+
+
+@Stage('events')
+def load_day_fragments(days: list[Calendar]) -> list[dict]:
+    """
+    Returns the response payload of every given day. Payloads missing from
+    the cache are built from the snapshot, or without one from a single
+    batched relation query instead of lazy loading relations and events. Payloads are shared
+    between responses, so they must never be modified.
+    :param days: Calendar rows
+    :return: Payloads in the same order as days
+    """
+    fragments: list[dict] = day_fragments.get_many([day.id for day in days])
+    missing: dict[int, Calendar] = {
+        day.id: day for day, fragment in zip(days, fragments)
+        if fragment is None
+    }
+    if not missing:
+        return fragments
+    events: dict[int, list[tuple[str, str]]] = {
+        day_id: [] for day_id in missing
+    }
+    snapshot: Snapshot = get_calendar_index().snapshot
+    if snapshot is not None:
+        for day in missing.values():
+            pos: int = snapshot.find('ad', day.ad_sn)
+            if pos is not None:
+                events[day.id] = snapshot.events(pos)
+        missing = {}
+    for batch in chunked(list(missing), MAX_BOUND_PARAMETERS):
+        for day_id, event_class, event_name in db.session.execute(
+                db.select(
+                    CalendarEventRelationship.day_id,
+                    Events.event_class, Events.event_name
+                ).join(Events, CalendarEventRelationship.event_id == Events.id)
+                .where(CalendarEventRelationship.day_id.in_(batch))
+                .order_by(CalendarEventRelationship.id)):
+            events[day_id].append((event_class, event_name))
+    for pos, day in enumerate(days):
+        if fragments[pos] is None:
+            fragments[pos] = build_day_fragment(day, events[day.id])
+            day_fragments.put(day.id, fragments[pos])
+    return fragments
+
+
+def load_encoded_days(days: list[Calendar],
+                      fields: Optional[tuple[str, ...]] = None,
+                      media: str = 'json') -> list[bytes]:
+    """
+    Returns the encoded payload of every given day, encoding each day once
+    and then reusing the bytes in every response containing it
+    :param days: Calendar rows
+    :param fields: Parts of the payload to include, None for all of them
+    :param media: 'json' or 'msgpack'
+    :return: Encoded payloads in the same order as days
+    """
+    encoded: list[bytes] = encoded_days.get_many(
+        [(media, fields, day.id) for day in days]
+    )
+    missing: list[int] = [
+        pos for pos, value in enumerate(encoded) if value is None
+    ]
+    if not missing:
+        return encoded
+    missing_days: list[Calendar] = [days[pos] for pos in missing]
+    if fields is None:
+        fragments: list[dict] = load_day_fragments(missing_days)
+    elif not {'event', 'panchangam', 'tithi'} & set(fields):
+        # Nothing needs the events, skip loading them
+        fragments = [build_day_fragment(day, [], fields) for day in missing_days]
+    else:
+        fragments = [
+            {field: fragment[field] for field in fields}
+            for fragment in load_day_fragments(missing_days)
+        ]
+    encode = pack if media == 'msgpack' else app.json.encode
+    for pos, fragment in zip(missing, fragments):
+        encoded[pos] = encode(fragment)
+        encoded_days.put((media, fields, days[pos].id), encoded[pos])
+    return encoded
+
+
+@Stage('serialize')
+def calender_result_to_bytes(calendar_days, bs_as_key: bool = False,
+                             fields: Optional[tuple[str, ...]] = None,
+                             media: str = 'json') -> bytes:
+    """
+    Same document as calender_result_to_dict, assembled from the encoded day
+    payloads instead of serializing the nested dicts
+    :param calendar_days: Rows whose first item is the day
+    :param bs_as_key: Nest the days by BS date instead of AD date
+    :param fields: Parts of the day payloads to include, None for all
+    :param media: 'json' or 'msgpack'
+    :return: Encoded document
+    """
+    caltype: str = 'bs' if bs_as_key else 'ad'
+    days: list[Calendar] = [date[0] for date in calendar_days]
+    data: dict[str, dict[str, dict[str, bytes]]] = {}
+    for day, encoded in zip(days, load_encoded_days(days, fields, media)):
+        # A single attribute read, they are slow on ORM rows
+        sn: int = getattr(day, f'{caltype}_sn')
+        yyyy: str = str(sn // 10000)
+        mm: str = str(sn // 100 % 100)
+        dd: str = str(sn % 100)
+        if yyyy not in data:
+            data[yyyy] = {}
+        if mm not in data[yyyy]:
+            data[yyyy][mm] = {}
+        data[yyyy][mm][dd] = encoded
+    if media == 'msgpack':
+        return join_map(data)
+    return join_object(data)
+
+
 def calender_result_to_dict(calendar_days, bs_as_key: bool = False):
     data: dict = {}
-    for date in calendar_days:
-        yyyy: str = str(
-            getattr(
-                date[0],
-                f'{"bs" if bs_as_key else "ad"}_year'
-            )
-        )
-        mm: str = str(
-            getattr(
-                date[0],
-                f'{"bs" if bs_as_key else "ad"}_month'
-            )
-        )
+    caltype: str = 'bs' if bs_as_key else 'ad'
+    days: list[Calendar] = [date[0] for date in calendar_days]
+    for day, fragment in zip(days, load_day_fragments(days)):
+        yyyy: str = str(getattr(day, f'{caltype}_year'))
+        mm: str = str(getattr(day, f'{caltype}_month'))
+        dd: str = str(getattr(day, f'{caltype}_day'))
         if yyyy not in data:
             data[yyyy] = {}
         if mm not in data[yyyy]:
             data[yyyy][mm] = {}
-        dd: str = str(
-            getattr(
-                date[0],
-                f'{"bs" if bs_as_key else "ad"}_day'
+        data[yyyy][mm][dd] = fragment
+    return data
+
+
+def chunked(items: list, size: int):
+    for i in builtins.range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def load_event_ids() -> dict[tuple[str, str], int]:
+    """
+    Loads every known event into a (event_name, event_class) -> id map
+    :return: Event lookup map
+    """
+    return {
+        (name, event_class): event_id
+        for event_id, name, event_class in db.session.execute(
+            db.select(Events.id, Events.event_name, Events.event_class)
+        )
+    }
+
+
+def import_artifact(artifact: Artifact,
+                    event_ids: dict[tuple[str, str], int]) -> int:
+    """
+    Bulk imports one parsed artifact into the database. Rows that already
+    exist are left untouched, the caller is responsible for committing.
+    :param artifact: Artifact parsed by the artifact loader
+    :param event_ids: (event_name, event_class) -> id map, updated in place
+    :return: Number of inserted rows
+    """
+    started: float = time.perf_counter()
+    days: list[dict] = []
+    day_events: dict[int, list[tuple[str, str]]] = {}
+    for day in artifact.days:
+        days.append({
+            'ad_sn': day.ad_sn, 'bs_sn': day.bs_sn,
+            'ad_year': day.ad_year, 'ad_month': day.ad_month,
+            'ad_day': day.ad_day, 'bs_year': day.bs_year,
+            'bs_month': day.bs_month, 'bs_day': day.bs_day,
+            'is_holiday': day.is_holiday
+        })
+        # Collect all the events, tithi first as the old importer did
+        cal_events: list[tuple[str, str]] = [(day.tithi, 'tithi')]
+        cal_events += [(e, 'event') for e in day.events]
+        cal_events += [(e, 'panchangam') for e in day.panchangam]
+        day_events[day.ad_sn] = cal_events
+    if not days:
+        return 0
+    inserted: int = 0
+    for batch in chunked(days, IMPORT_BATCH_SIZE):
+        inserted += db.session.execute(
+            insert_ignore(Calendar.__table__, db.engine.dialect.name), batch
+        ).rowcount
+
+    new_events: list[dict] = []
+    for cal_events in day_events.values():
+        for event in cal_events:
+            if event not in event_ids:
+                event_ids[event] = -1
+                new_events.append(
+                    {'event_name': event[0], 'event_class': event[1]}
+                )
+    if new_events:
+        last_id: int = db.session.execute(
+            db.select(db.func.coalesce(db.func.max(Events.id), 0))
+        ).scalar()
+        for batch in chunked(new_events, IMPORT_BATCH_SIZE):
+            db.session.execute(
+                insert_ignore(Events.__table__, db.engine.dialect.name), batch
             )
+        inserted += len(new_events)
+        for event_id, name, event_class in db.session.execute(
+                db.select(Events.id, Events.event_name, Events.event_class)
+                .where(Events.id > last_id)):
+            event_ids[(name, event_class)] = event_id
+
+    sn_range = (min(day_events), max(day_events))
+    day_ids: dict[int, int] = dict(db.session.execute(
+        db.select(Calendar.ad_sn, Calendar.id)
+        .where(Calendar.ad_sn.between(*sn_range))
+    ).all())
+    existing: set[tuple[int, int]] = set(db.session.execute(
+        db.select(
+            CalendarEventRelationship.day_id,
+            CalendarEventRelationship.event_id
+        ).join(Calendar, Calendar.id == CalendarEventRelationship.day_id)
+        .where(Calendar.ad_sn.between(*sn_range))
+    ).all())
+    relations: list[dict] = []
+    for ad_sn in sorted(day_events):
+        for event in day_events[ad_sn]:
+            relation: tuple[int, int] = (day_ids[ad_sn], event_ids[event])
+            if relation not in existing:
+                existing.add(relation)
+                relations.append(
+                    {'day_id': relation[0], 'event_id': relation[1]}
+                )
+    for batch in chunked(relations, IMPORT_BATCH_SIZE):
+        db.session.execute(
+            insert_ignore(CalendarEventRelationship.__table__, db.engine.dialect.name),
+            batch
         )
+    inserted += len(relations)
+    elapsed: float = time.perf_counter() - started
+    record_import(inserted, elapsed)
+    print(
+        f'[I] Imported {os.path.basename(artifact.path)}: {inserted} rows '
+        f'in {elapsed:.2f}s ({inserted / max(elapsed, 1e-9):.0f} rows/s)'
+    )
+    return inserted
 
-        data[yyyy][mm][dd] = {
-            'tithi': '',
-            'event': [],
-            'panchangam': [],
-            'date': {
-                'ad': {
-                    'year': date[0].ad_year,
-                    'month': date[0].ad_month,
-                    'day': date[0].ad_day,
-                },
-                'bs': {
-                    'year': date[0].bs_year,
-                    'month': date[0].bs_month,
-                    'day': date[0].bs_day,
-                },
-            },
-            'public_holiday': date[0].is_holiday
-        }
-        for relation in date[0].CalendarEventRelationship:
-            if relation.events.event_class == 'tithi':
-                data[yyyy][mm][dd]['tithi'] = relation.events.event_name
-            else:
-                data[yyyy][mm][dd][relation.events.event_class].append(
-                    relation.events.event_name
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def delete_artifact_year(year: int) -> None:
+    """
+    Removes every day of a BS year along with its event relations
+    :param year: BS year of the artifact
+    :return:
+    """
+    day_ids = db.select(Calendar.id).where(Calendar.bs_year == year)
+    db.session.execute(
+        db.delete(CalendarEventRelationship).where(
+            CalendarEventRelationship.day_id.in_(day_ids)
+        )
+    )
+    db.session.execute(db.delete(Calendar).where(Calendar.bs_year == year))
+
+
+def sync_artifacts(artifacts_dir_path: str) -> bool:
+    """
+    Brings the database in line with the artifacts directory. Files whose
+    size and mtime match the import manifest are skipped without being
+    read, changed files are re-imported and removed years are deleted.
+    :param artifacts_dir_path: Directory holding artifact-<year>.json files
+    :return: True if any data in the database changed
+    """
+    artifacts: dict[int, str] = find_artifacts(artifacts_dir_path)
+    print(f'[I] Artifacts found for years:  {", ".join(str(year) for year in sorted(artifacts))} ')
+    manifest: dict[int, ArtifactManifest] = {
+        entry.year: entry
+        for entry in db.session.execute(
+            db.select(ArtifactManifest)
+        ).scalars()
+    }
+    removed: list[int] = [year for year in manifest if year not in artifacts]
+    pending: dict[int, tuple[os.stat_result, str]] = {}
+    for year, path in artifacts.items():
+        stat: os.stat_result = os.stat(path)
+        entry: ArtifactManifest = manifest.get(year)
+        if entry is not None and entry.size == stat.st_size \
+                and entry.mtime_ns == stat.st_mtime_ns:
+            continue
+        digest: str = file_sha256(path)
+        if entry is not None and entry.sha256 == digest:
+            # Touched but not modified, remember the new mtime only
+            entry.mtime_ns = stat.st_mtime_ns
+            continue
+        pending[year] = (stat, digest)
+    db.session.commit()
+
+    for year in sorted(removed):
+        print(f'[I] Artifact for year {year} was removed, deleting its days')
+        delete_artifact_year(year)
+        db.session.delete(manifest[year])
+        db.session.commit()
+    if pending:
+        event_ids: dict[tuple[str, str], int] = load_event_ids()
+    # Files are parsed by worker processes while earlier years are imported
+    parsed: Iterator[Artifact] = iter_artifacts(
+        [artifacts[year] for year in sorted(pending)], workers=ARTIFACT_WORKERS
+    )
+    for year, artifact in zip(sorted(pending), parsed):
+        stat, digest = pending[year]
+        try:
+            if year in manifest:
+                delete_artifact_year(year)
+            import_artifact(artifact, event_ids=event_ids)
+            db.session.merge(ArtifactManifest(
+                year=year, size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                sha256=digest,
+                imported_at=datetime.now(dt_timezone.utc).replace(tzinfo=None)
+            ))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    if removed or any(year in manifest for year in pending):
+        # Drop events no longer referenced by any day
+        db.session.execute(
+            db.delete(Events).where(
+                Events.id.not_in(db.select(CalendarEventRelationship.event_id))
+            )
+        )
+        db.session.commit()
+    if not removed and not pending:
+        print('[I] All artifacts are up to date')
+        return False
+    invalidate_calendar_index()
+    return True
+
+
+def seconds_until_midnight() -> int:
+    now: datetime = local_now()
+    midnight: datetime = datetime.combine(
+        now.date() + timedelta(days=1), datetime.min.time()
+    )
+    return max(int((midnight - now).total_seconds()), 1)
+
+
+def encoded_response(body: bytes, output_format: str):
+    if output_format == 'json':
+        body += b'\n'
+    return app.response_class(body, mimetype=MEDIA_TYPES[output_format])
+
+
+def negotiate_format() -> str:
+    """
+    Picks the response format from the format argument, or from the Accept
+    header when the argument is not given
+    :return: Format name, validated by parse_response_options()
+    """
+    if 'format' in request.args:
+        return request.args['format']
+    best: str = request.accept_mimetypes.best_match(
+        [*MEDIA_TYPES.values(), 'application/x-msgpack'],
+        default=MEDIA_TYPES['json']
+    )
+    if best == 'application/x-msgpack':
+        return 'msgpack'
+    return {media_type: name for name, media_type in MEDIA_TYPES.items()}[best]
+
+
+def parse_response_options() -> tuple[str, Optional[tuple[str, ...]]]:
+    """
+    Validates the requested format and the fields argument, a comma
+    separated subset of DAY_FIELDS
+    :return: Format name and fields to include, None for all of them
+    """
+    output_format: str = negotiate_format()
+    if output_format not in MEDIA_TYPES:
+        raise ValueError(
+            f'Unsupported format \'{output_format}\' ! Use one of: '
+            f'{", ".join(MEDIA_TYPES)}'
+        )
+    if output_format == 'msgpack' and not msgpack_available():
+        raise ValueError(
+            'MessagePack responses are not available, the server needs '
+            'msgpack installed'
+        )
+    return output_format, parse_fields(request.args.get('fields', ''))
+
+
+def parse_fields(value: str) -> Optional[tuple[str, ...]]:
+    """
+    :param value: Comma separated subset of DAY_FIELDS
+    :return: Sorted fields to include, None for all of them
+    :raises ValueError: A field is unknown
+    """
+    fields: tuple[str, ...] = tuple(sorted({
+        field.strip() for field in value.split(',') if field.strip() != ''
+    }))
+    for field in fields:
+        if field not in DAY_FIELDS:
+            raise ValueError(
+                f'Unknown field \'{field}\' ! Available fields: '
+                f'{", ".join(DAY_FIELDS)}'
+            )
+    return None if len(fields) == 0 or fields == DAY_FIELDS else fields
+
+
+def response_cache_key(caltype: str, dates: dict[str, str]) -> tuple:
+    """
+    Builds a cache key for a /v2 query from the path with calendar
+    variables already resolved and the normalized query arguments
+    :param caltype: Calendar type from the URL
+    :param dates: Date parameters from the URL
+    :return: Cache key
+    """
+    args: list = []
+    for flag in ('only_holidays', 'except_holidays', 'bs_as_key'):
+        value: str = request.args.get(flag, '0')
+        args.append(bool(int(value)) if value.strip().isdigit() else value)
+    args.append(tuple(sorted({
+        item for item in request.args.get('filter_tithis', '').split(';')
+        if item.strip() != ''
+    })))
+    args.append(request.args.get('search', ''))
+    args.append(negotiate_format())
+    try:
+        args.append(parse_fields(request.args.get('fields', '')))
+    except ValueError:
+        # Answered with an error by the view
+        args.append(request.args.get('fields', ''))
+    return (
+        request.endpoint, caltype.lower(),
+        tuple(
+            (name, calendar_var_replace(caltype=caltype, string=value))
+            for name, value in sorted(dates.items())
+        ),
+        tuple(args)
+    )
+
+
+def cached_response(view):
+    """
+    Serves repeated /v2 queries from the response cache and answers
+    conditional requests with strong ETags derived from the dataset version.
+    Compressed variants are cached next to the responses, so a hot response
+    is compressed only once per content encoding.
+    """
+    @functools.wraps(view)
+    def wrapper(caltype: str, **dates: str):
+        index: CalendarIndex = get_calendar_index()
+        key: tuple = (index.version, response_cache_key(caltype, dates))
+        entry: tuple = response_cache.get(key)
+        if entry is None:
+            response = app.make_response(view(caltype, **dates))
+            if response.status_code not in (200, 404):
+                return response
+            if not response.is_streamed:
+                response_cache.put(key, (
+                    response.get_data(), response.status_code,
+                    response.mimetype
+                ))
+        else:
+            response = app.response_class(
+                entry[0], status=entry[1], mimetype=entry[2]
+            )
+        max_age: int = RESPONSE_MAX_AGE
+        if any('@' in value for value in dates.values()):
+            # Variables resolve to another date after midnight
+            max_age = min(max_age, seconds_until_midnight())
+        response.cache_control.public = True
+        response.vary.add('Accept')
+        response.cache_control.max_age = max_age
+        encoding: Optional[str] = None
+        if COMPRESSION and not response.is_streamed \
+                and len(response.get_data()) >= COMPRESS_MIN_SIZE:
+            response.vary.add('Accept-Encoding')
+            encoding = choose_encoding(request.accept_encodings)
+        if encoding is not None:
+            compressed: bytes = compressed_cache.get((key, encoding))
+            if compressed is None:
+                with Stage('compress'):
+                    compressed = compress(
+                        response.get_data(), encoding, cached=True
+                    )
+                compressed_cache.put(
+                    (key, encoding), compressed, size=len(compressed)
                 )
-    return data
+            response.set_data(compressed)
+            response.content_encoding = encoding
+        if response.status_code == 200:
+            # Every encoding is a different representation with its own ETag
+            response.set_etag(
+                hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+                + (f'-{encoding}' if encoding is not None else '')
+            )
+            if index.last_modified is not None:
+                response.last_modified = index.last_modified
+            if not response.is_streamed:
+                response.make_conditional(request)
+            elif not is_resource_modified(
+                    request.environ, etag=response.get_etag()[0],
+                    last_modified=response.last_modified):
+                # make_conditional() would buffer the whole stream
+                response.response = []
+                response.status_code = 304
+        return response
+    return wrapper
+
+
+def read_only(view):
+    """
+    Sends the queries of a view that never writes to the next read replica,
+    responses served from the cache do not take one
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_engine = read_replicas.next()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.before_request
+def start_request_metrics():
+    if METRICS or SERVER_TIMING:
+        start_request()
+
+
+@app.after_request
+def finish_request_metrics(response):
+    """
+    Records the request, registered first so it runs after the other
+    after_request handlers and includes compression
+    """
+    timings: Optional[dict[str, float]] = finish_request(
+        request.endpoint or 'unknown', response.status_code
+    )
+    if SERVER_TIMING and timings is not None:
+        response.headers['Server-Timing'] = server_timing(timings)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Compresses large responses that did not go through the response cache
+    """
+    if not COMPRESSION or response.is_streamed or response.direct_passthrough \
+            or response.status_code != 200 or response.content_encoding \
+            or len(response.get_data()) < COMPRESS_MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding: Optional[str] = choose_encoding(request.accept_encodings)
+    if encoding is not None:
+        with Stage('compress'):
+            response.set_data(compress(response.get_data(), encoding))
+        response.content_encoding = encoding
+    return response
 
 
 @app.route('/')
@@ -264,8 +1293,13 @@ def docs():
 
 
 @app.route('/v2/date/<string:caltype>/<string:date>')
+@cached_response
+@read_only
 def date_view(caltype: str, date: str):
-    today = get_today(caltype=caltype)
+    try:
+        output_format, fields = parse_response_options()
+    except ValueError as e:
+        return {'error': str(e)}, 400
     try:
         s_date = [
             int(chunk)
@@ -278,7 +1312,7 @@ def date_view(caltype: str, date: str):
             'error': 'Invalid start date format ! Supported format: "yyyy-m-d"'
         }, 400
     try:
-        calendar = calender_query_builder(
+        query_args: dict = dict(
             caltype=caltype.lower(),
             start=(
                 s_date[0],
@@ -301,26 +1335,37 @@ def date_view(caltype: str, date: str):
             search_event=request.args.get(
                 'search', '')
         )
-        calendar_days = db.session.execute(calendar).all()
+        if output_format == 'ndjson':
+            return stream_calendar_days(fields=fields, **query_args)
+        calendar_days = find_calendar_days(**query_args)
         if len(calendar_days) == 0:
             return {'error': 'No data found for date !'}, 404
-        return calender_result_to_dict(
-            calendar_days=calendar_days,
-            bs_as_key=bool(
-                int(
-                    request.args.get(
-                        'bs_as_key', 0
+        return encoded_response(
+            calender_result_to_bytes(
+                calendar_days=calendar_days,
+                bs_as_key=bool(
+                    int(
+                        request.args.get(
+                            'bs_as_key', 0
+                        )
                     )
-                )
-            )
+                ),
+                fields=fields, media=output_format
+            ),
+            output_format
         )
     except CalendarQueryException as e:
         return {'error': str(e)}, 500
 
 
 @app.route('/v2/range/<string:caltype>/from/<string:sdate>/to/<string:edate>')
+@cached_response
+@read_only
 def range(caltype: str, sdate: str, edate: str):
-    today = get_today(caltype=caltype)
+    try:
+        output_format, fields = parse_response_options()
+    except ValueError as e:
+        return {'error': str(e)}, 400
     try:
         s_date = [
             int(chunk)
@@ -344,7 +1389,7 @@ def range(caltype: str, sdate: str, edate: str):
             'error': 'Invalid end date format ! Supported format: "yyyy-m-d"'
         }, 400
     try:
-        calendar = calender_query_builder(
+        query_args: dict = dict(
             caltype=caltype.lower(),
             start=(
                 s_date[0],
@@ -377,26 +1422,335 @@ def range(caltype: str, sdate: str, edate: str):
                 'search', ''
             )
         )
-        calendar_days = db.session.execute(calendar).all()
+        if output_format == 'ndjson':
+            return stream_calendar_days(fields=fields, **query_args)
+        calendar_days = find_calendar_days(**query_args)
         if len(calendar_days) == 0:
             return {'error': 'No data found for date !'}, 404
-        return calender_result_to_dict(
-            calendar_days=calendar_days,
-            bs_as_key=bool(
-                int(
-                    request.args.get(
-                        'bs_as_key', 0
+        return encoded_response(
+            calender_result_to_bytes(
+                calendar_days=calendar_days,
+                bs_as_key=bool(
+                    int(
+                        request.args.get(
+                            'bs_as_key', 0
+                        )
                     )
+                ),
+                fields=fields, media=output_format
+            ),
+            output_format
+        )
+    except CalendarQueryException as e:
+        return {'error': str(e)}, 400
+
+
+@app.route('/v2/search')
+def search():
+    text: str = request.args.get('q', '')
+    if text.strip() == '':
+        return {'error': 'Missing search text ! Use "?q=<text>"'}, 400
+    try:
+        limit: int = int(request.args.get('limit', 50))
+    except ValueError:
+        return {'error': 'Invalid limit ! It has to be a number'}, 400
+    if limit < 1:
+        return {'error': 'Invalid limit ! It has to be at least 1'}, 400
+    limit = min(limit, MAX_SEARCH_RESULTS)
+    events: SearchIndex = get_search_index()
+    if events is None:
+        return {'error': 'Search is not available without USE_SNAPSHOT=1'}, 503
+    index: CalendarIndex = get_calendar_index()
+    results: list[SearchResult] = events.search(text, limit=limit)
+    if len(results) == 0:
+        return {'error': 'No events found !'}, 404
+    return {
+        'results': [
+            {
+                'event': result.event_name,
+                'event_class': result.event_class,
+                'dates': [
+                    {
+                        'ad': {
+                            'year': index[pos].ad_year,
+                            'month': index[pos].ad_month,
+                            'day': index[pos].ad_day,
+                        },
+                        'bs': {
+                            'year': index[pos].bs_year,
+                            'month': index[pos].bs_month,
+                            'day': index[pos].bs_day,
+                        },
+                        'public_holiday': index[pos].is_holiday
+                    }
+                    for pos in result.days
+                ]
+            }
+            for result in results
+        ]
+    }
+
+
+def parse_flag(value) -> bool:
+    """
+    Parses a flag of a batch query like the URL parameters of the GET
+    endpoints, which take 0 or 1, accepting JSON booleans as well
+    :param value: Value from the JSON body
+    :return: The flag
+    :raises ValueError: The value is not a boolean or an integer
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return bool(value)
+    if isinstance(value, str):
+        return bool(int(value))
+    raise ValueError(f'"{value}" is not a flag')
+
+
+@app.route('/v2/batch', methods=['POST'])
+@read_only
+def batch():
+    try:
+        output_format, fields = parse_response_options()
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    if output_format == 'ndjson':
+        return {
+            'error': 'Batch results can not be streamed, use json or msgpack'
+        }, 400
+    body = request.get_json(silent=True)
+    queries = body.get('queries') if isinstance(body, dict) else None
+    if not isinstance(queries, list) or len(queries) == 0:
+        return {
+            'error': 'Expected a JSON body like {"queries": [{"caltype": '
+                     '"bs", "date": "@today"}, ...]}'
+        }, 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return {
+            'error': f'Too many queries ! At most {MAX_BATCH_QUERIES} are '
+                     f'allowed per batch'
+        }, 400
+    try:
+        bs_as_key: bool = parse_flag(body.get('bs_as_key', 0))
+    except ValueError:
+        return {'error': '"bs_as_key" has to be true, false, 0 or 1'}, 400
+    # Every query sees the same dataset and the same today, even if a
+    # reload or midnight happens while the batch runs
+    index: CalendarIndex = get_calendar_index()
+    days: dict[int, Calendar] = {}
+    results: list[dict] = []
+    for spec in queries:
+        if not isinstance(spec, dict):
+            results.append({'status': 400, 'error': 'Query has to be an object'})
+            continue
+        caltype: str = str(spec.get('caltype', 'ad')).lower()
+        if caltype not in ('ad', 'bs'):
+            results.append({
+                'status': 400,
+                'error': f'Unspported calendar type \'{caltype}\''
+            })
+            continue
+        try:
+            if 'date' in spec:
+                start: tuple[int, int, int] = parse_date_param(
+                    caltype, str(spec['date'])
                 )
+                end: tuple[int, int, int] = (0, 1, 1)
+            else:
+                start = parse_date_param(
+                    caltype, str(spec.get('from', ''))
+                )
+                end = parse_date_param(
+                    caltype, str(spec.get('to', ''))
+                )
+        except ValueError:
+            results.append({
+                'status': 400,
+                'error': 'Invalid date format ! Use "date" or "from" and "to" '
+                         'in format "yyyy-m-d"'
+            })
+            continue
+        filter_tithis = spec.get('filter_tithis', [])
+        if isinstance(filter_tithis, str):
+            filter_tithis = filter_tithis.split(';')
+        search_event = spec.get('search', '')
+        try:
+            only_holidays: bool = parse_flag(spec.get('only_holidays', 0))
+            except_holidays: bool = parse_flag(spec.get('except_holidays', 0))
+        except ValueError:
+            results.append({
+                'status': 400,
+                'error': '"only_holidays" and "except_holidays" have to be '
+                         'true, false, 0 or 1'
+            })
+            continue
+        if not isinstance(filter_tithis, list) \
+                or not all(isinstance(item, str) for item in filter_tithis):
+            results.append({
+                'status': 400,
+                'error': '"filter_tithis" has to be a list of tithis or a '
+                         '";" separated string'
+            })
+            continue
+        if not isinstance(search_event, str):
+            results.append({'status': 400, 'error': '"search" has to be a string'})
+            continue
+        try:
+            calendar_days = find_calendar_days(
+                caltype=caltype, start=start, end=end,
+                only_holidays=only_holidays,
+                except_holidays=except_holidays,
+                filter_tithis=filter_tithis,
+                search_event=search_event
+            )
+        except CalendarQueryException as e:
+            results.append({'status': 400, 'error': str(e)})
+            continue
+        if len(calendar_days) == 0:
+            results.append({'status': 404, 'error': 'No data found for date !'})
+            continue
+        dates: list[str] = []
+        for row in calendar_days:
+            day: Calendar = row[0]
+            days.setdefault(day.id, day)
+            dates.append(
+                f'{day.bs_year}-{day.bs_month}-{day.bs_day}' if bs_as_key
+                else f'{day.ad_year}-{day.ad_month}-{day.ad_day}'
             )
+        results.append({'status': 200, 'dates': dates})
+    # Days shared by several queries are serialized once
+    unique_days: list[Calendar] = list(days.values())
+    payload: dict[str, bytes] = {
+        f'{day.bs_year}-{day.bs_month}-{day.bs_day}' if bs_as_key
+        else f'{day.ad_year}-{day.ad_month}-{day.ad_day}': encoded
+        for day, encoded in zip(
+            unique_days, load_encoded_days(unique_days, fields, output_format)
         )
+    }
+    if output_format == 'msgpack':
+        return encoded_response(join_map({
+            'days': payload,
+            'results': pack(results),
+            'version': pack(index.version),
+        }), output_format)
+    return encoded_response(join_object({
+        'days': payload,
+        'results': app.json.encode(results),
+        'version': app.json.encode(index.version),
+    }), output_format)
+
+
+def export_days(batches: Iterator[list]) -> Iterator[ArtifactDay]:
+    """
+    Turns batches of days into the days of the export pipeline, loading
+    their events one batch at a time
+    :param batches: Batches from iter_calendar_days()
+    :return: Days in date order
+    """
+    for batch in batches:
+        for day, fragment in zip(batch, load_day_fragments(batch)):
+            yield ArtifactDay(
+                day.ad_sn, day.bs_sn, day.ad_year, day.ad_month, day.ad_day,
+                day.bs_year, day.bs_month, day.bs_day,
+                fragment['public_holiday'], fragment['tithi'],
+                tuple(fragment['event']), tuple(fragment['panchangam'])
+            )
+
+
+@app.route('/v2/export/<string:export_format>')
+@read_only
+def export(export_format: str):
+    if export_format not in EXPORT_MEDIA_TYPES:
+        return {
+            'error': f'Unsupported export format \'{export_format}\' ! Use '
+                     f'one of: {", ".join(EXPORT_MEDIA_TYPES)}'
+        }, 400
+    caltype: str = request.args.get('caltype', 'ad').lower()
+    if caltype not in ('ad', 'bs'):
+        return {'error': f'Unspported calendar type \'{caltype}\''}, 400
+    try:
+        options: ExportOptions = ExportOptions(
+            event_types=parse_event_types(
+                request.args.get('events', ','.join(EVENT_TYPES))
+            ),
+            append_bida=request.args.get('holiday_prefix', '0') == '1',
+            append_panchangam=request.args.get('panchangam_prefix', '0') == '1',
+            flatten_holidays=request.args.get('flatten_holidays', '0') == '1'
+        )
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    index: CalendarIndex = get_calendar_index()
+    if len(index) == 0:
+        return {'error': 'No data found for date !'}, 404
+    # Without from and to everything is exported
+    first: tuple[int, int, int] = tuple(
+        getattr(index[0], f'{caltype}_{part}') for part in ('year', 'month', 'day')
+    )
+    last: tuple[int, int, int] = tuple(
+        getattr(index[-1], f'{caltype}_{part}') for part in ('year', 'month', 'day')
+    )
+    try:
+        start: tuple[int, int, int] = parse_date_param(
+            caltype, request.args['from']
+        ) if request.args.get('from') else first
+        end: tuple[int, int, int] = parse_date_param(
+            caltype, request.args['to']
+        ) if request.args.get('to') else last
+    except ValueError:
+        return {
+            'error': 'Invalid from or to date format ! Supported format: "yyyy-m-d"'
+        }, 400
+    batches: Iterator[list] = iter_calendar_days(
+        caltype=caltype, start=start, end=end
+    )
+    try:
+        # Read the first batch up front to answer errors and empty results
+        first_batch: list = next(batches, None)
     except CalendarQueryException as e:
         return {'error': str(e)}, 400
+    if first_batch is None:
+        return {'error': 'No data found for date !'}, 404
+
+    # The first walk continues the query started above
+    first_walk: list[Iterator[list]] = [itertools.chain([first_batch], batches)]
+
+    def walk_days() -> Iterator[ArtifactDay]:
+        return export_days(first_walk.pop() if first_walk else iter_calendar_days(
+            caltype=caltype, start=start, end=end
+        ))
+
+    def generate() -> Iterator[bytes]:
+        yield from buffered(emit(
+            export_format,
+            # kholiday files walk the days once per section, every further
+            # walk runs the query again instead of keeping the days
+            Reiterable(walk_days) if export_format == 'kholiday' else walk_days(),
+            options, updated=index.last_modified
+        ))
+
+    response = app.response_class(
+        stream_with_context(generate()),
+        content_type=EXPORT_MEDIA_TYPES[export_format]
+    )
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename="holiday_np_np@{"_".join(options.event_types)}' \
+        f'{EXPORT_EXTENSIONS[export_format]}"'
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    if not METRICS:
+        return {'error': 'Metrics are disabled'}, 404
+    return app.response_class(
+        metrics_registry.render(), content_type=METRICS_CONTENT_TYPE
+    )
 
 
 @app.route('/v2/@today')
 def today():
-    dtn = datetime.now()
+    dtn = local_now()
     return redirect(
         url_for(
             'date_view',
@@ -434,114 +1788,109 @@ def old_date_view(opmode: str):
         return {'error': 'Invalid operation mode !'}, 400
 
 
-if __name__ == '__main__':
-    artifacts_dir_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts')
-    artifacts_dir: list[str] = os.listdir(artifacts_dir_path)
+def database_fingerprint(engine) -> tuple:
+    """
+    :param engine: Engine of the primary database or of a replica
+    :return: Imported artifacts and a checksum of the day ids, replicas
+             holding other ids would mix up the cached day payloads
+    """
+    with engine.connect() as connection:
+        return (
+            tuple(connection.execute(
+                db.select(ArtifactManifest.year, ArtifactManifest.sha256)
+                .order_by(ArtifactManifest.year)
+            ).all()),
+            tuple(connection.execute(db.select(
+                db.func.count(Calendar.id),
+                db.func.sum(Calendar.id * (Calendar.ad_sn % 997))
+            )).one()),
+            connection.execute(
+                db.select(db.func.count(CalendarEventRelationship.id))
+            ).scalar()
+        )
+
+
+def check_read_replicas() -> None:
+    """
+    Reads from the replicas holding the same data as the primary database,
+    unreachable and outdated ones are left out
+    :return:
+    """
+    primary: tuple = database_fingerprint(db.engine)
+    replicas: list = []
+    for number, uri in enumerate(DATABASE_REPLICAS):
+        engine = db.engines[f'replica-{number}']
+        try:
+            if database_fingerprint(engine) != primary:
+                print(f'[W] Read replica {engine.url!r} differs from the primary database, not using it')
+                continue
+        except SQLAlchemyError as e:
+            print(f'[W] Read replica {engine.url!r} is not usable ({e.__class__.__name__}), not using it')
+            continue
+        replicas.append(engine)
+    read_replicas.set(replicas)
+    if DATABASE_REPLICAS:
+        print(f'[I] Reading from {len(replicas)} of {len(DATABASE_REPLICAS)} replicas')
+
+
+def bootstrap() -> None:
+    """
+    Prepares the database for serving: creates missing tables, applies
+    pending schema migrations, syncs the artifacts unless SKIP_DB_CREATE is
+    set, loads the calendar index and checks the read replicas.
+    Processes starting at the same time take turns, so only the first one
+    imports anything and the others find the manifest up to date.
+    :return:
+    """
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(os.path.join(app.instance_path, 'bootstrap.lock'), 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        with app.app_context():
+            if db.engine.dialect.name == 'sqlite':
+                # Readers never wait on the importer of another process
+                db.session.execute(db.text('PRAGMA journal_mode=WAL'))
+            # Replicas are copies of the primary, never created or migrated here
+            db.create_all(bind_key=None)
+            with db.engine.connect() as connection:
+                changed: bool = migrate(connection, db.metadata) > 0
+            if not int(os.environ.get('SKIP_DB_CREATE', 0)):
+                changed = sync_artifacts(ARTIFACTS_DIR) or changed
+            if changed:
+                with db.engine.connect() as connection:
+                    analyze(connection)
+            get_calendar_index()
+            check_read_replicas()
+    if QUERY_ENGINE == 'numpy' and (not numpy_available() or not USE_SNAPSHOT):
+        print('[W] QUERY_ENGINE=numpy needs numpy and USE_SNAPSHOT=1, using SQL queries')
+
+
+def enable_read_only() -> None:
+    """
+    Makes every database connection opened from now on read only, used
+    once the data has been imported and before worker processes are forked
+    :return:
+    """
     with app.app_context():
-        db.create_all()
-        available_years = sorted([
-            int(file.replace('.json', '').replace('artifact-', ''))
-            for file in artifacts_dir
-            if
-            file.startswith('artifact-') and file.endswith('.json')
-        ])
-        print(f'[I] Artifacts found for years:  {", ".join(str(year) for year in available_years)} ')
-        for year in available_years:
-            if int(os.environ.get('SKIP_DB_CREATE', 0)):
-                break
-            with open(os.path.join(artifacts_dir_path, f'artifact-{year}.json'), 'r') as cf:
-                cal = json.load(cf)
-            for eng_date in cal:
-                ENG_YEAR: int = int(
-                    eng_date.split('/')[0]
-                )
-                ENG_MONTH: int = int(
-                    eng_date.split('/')[1]
-                )
-                ENG_DAY: int = int(
-                    eng_date.split('/')[2]
-                )
+        set_query_only(db.engine)
+        # Forked workers must not share the parent's connections
+        for engine in db.engines.values():
+            engine.dispose()
 
-                NEP_YEAR: int = int(
-                    cal[eng_date]['nepali_date'].split('/')[0]
-                )
-                NEP_MONTH: int = int(
-                    cal[eng_date]['nepali_date'].split('/')[1]
-                )
-                NEP_DAY: int = int(
-                    cal[eng_date]['nepali_date'].split('/')[2]
-                )
 
-                _calendar = db.session.execute(
-                    db.select(Calendar).filter_by(
-                        ad_sn=int(f'{ENG_YEAR}{ENG_MONTH:02d}{ENG_DAY:02d}'),
-                        bs_sn=int(f'{NEP_YEAR}{NEP_MONTH:02d}{NEP_DAY:02d}'),
-                        ad_year=ENG_YEAR, ad_month=ENG_MONTH, ad_day=ENG_DAY,
-                        bs_year=NEP_YEAR, bs_month=NEP_MONTH, bs_day=NEP_DAY)
-                ).first()
-                calendar = None
-                if _calendar is None:
-                    calendar = Calendar(
-                        ad_sn=int(f'{ENG_YEAR}{ENG_MONTH:02d}{ENG_DAY:02d}'),
-                        bs_sn=int(f'{NEP_YEAR}{NEP_MONTH:02d}{NEP_DAY:02d}'),
-                        ad_year=ENG_YEAR, ad_month=ENG_MONTH, ad_day=ENG_DAY,
-                        bs_year=NEP_YEAR, bs_month=NEP_MONTH, bs_day=NEP_DAY,
-                        is_holiday=cal[eng_date]['is_public_holiday']
-                    )
-                    db.session.add(calendar)
-                    db.session.flush()
-                else:
-                    calendar = _calendar[0]
-                cal_events: list[tuple] = []
-                inserted_p_keys = []
-                # Collect all the events
-                cal_events.append((cal[eng_date]['tithi'], 'tithi'))
-                for event in cal[eng_date]['events']:
-                    if event != '':
-                        cal_events.append((event, 'event'))
-                for event in cal[eng_date]['panchangam']:
-                    if event != '':
-                        cal_events.append((event, 'panchangam'))
-
-                inserted_events: list[db.Model] = []
-                # Add them to database
-                for event in cal_events:
-                    exec = db.session.execute(
-                        db.select(Events).filter_by(
-                            event_name=event[0], event_class=event[1]
-                        )
-                    ).first()
-                    if exec is None:
-                        # Add event, it does not exist rn
-                        inserted_events.append(
-                            Events(
-                                event_name=event[0], event_class=event[1]
-                            )
-                        )
-                        db.session.add(inserted_events[-1])
-                    else:
-                        inserted_p_keys.append(exec[0].id)
-                db.session.flush()
-
-                for added_event in inserted_events:
-                    inserted_p_keys.append(added_event.id)
-                # Calander and events are now added, now build relations
-                for id in inserted_p_keys:
-                    ev = db.session.execute(
-                        db.select(CalendarEventRelationship).filter_by(
-                            day_id=calendar.id, event_id=id
-                        )
-                    ).first()
-                    if ev is None:
-                        db.session.add(
-                            CalendarEventRelationship(
-                                day_id=calendar.id, event_id=id
-                            )
-                        )
-                print(
-                    f'[I] Added date for year  {eng_date} '
-                    f'<-> {NEP_YEAR}/{NEP_MONTH}/{NEP_DAY}'
-                )
-        db.session.commit()
-    app.run(host=os.environ.get('HOST', '0.0.0.0'), port=os.environ.get('PORT', '8080'),
-            debug=int(os.environ.get('DEBUG', 0)))
+if __name__ == '__main__':
+    if os.environ.get('SERVER', 'flask') == 'asgi':
+        try:
+            import uvicorn
+        except ImportError:
+            print('[E] SERVER=asgi requires uvicorn, install it with "pip install uvicorn"')
+            sys.exit(1)
+        import asgi
+        asgi.serve(
+            host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', '8080')),
+            workers=int(os.environ.get('WORKERS', 1)), debug=bool(int(os.environ.get('DEBUG', 0)))
+        )
+    else:
+        bootstrap()
+        app.run(host=os.environ.get('HOST', '0.0.0.0'), port=os.environ.get('PORT', '8080'),
+                debug=int(os.environ.get('DEBUG', 0)))
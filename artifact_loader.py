@@ -0,0 +1,237 @@
+"""
+Shared loader of the artifact-<year>.json files, used by the server import
+and by utils.py. Files are parsed and validated in worker processes, every
+day is normalized into integer fields and AD/BS serials, and artifacts are
+merged lazily into one stream of days in date order.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Iterable, Iterator, NamedTuple, Optional
+import itertools
+import heapq
+import json
+import os
+
+# Smaller inputs are parsed in this process, starting workers costs more
+PARALLEL_MIN_BYTES: int = 4 * 1024 * 1024
+
+
+class ArtifactError(ValueError):
+    """
+    Raised when an artifact file cannot be read or holds invalid data
+    """
+
+
+class ArtifactDay(NamedTuple):
+    ad_sn: int
+    bs_sn: int
+    ad_year: int
+    ad_month: int
+    ad_day: int
+    bs_year: int
+    bs_month: int
+    bs_day: int
+    is_holiday: bool
+    tithi: str
+    events: tuple[str, ...]
+    panchangam: tuple[str, ...]
+
+
+class Artifact(NamedTuple):
+    path: str
+    # BS year from the file name, None for other file names
+    year: Optional[int]
+    # Sorted by AD serial
+    days: list[ArtifactDay]
+
+
+def serial(year: int, month: int, day: int) -> int:
+    # Same as int(f'{year}{month:02d}{day:02d}') used by the server
+    return year * 10000 + month * 100 + day
+
+
+def artifact_year(path: str) -> Optional[int]:
+    """
+    :param path: Path of an artifact file
+    :return: BS year of an artifact-<year>.json file, None for other names
+    """
+    name: str = os.path.basename(path)
+    if not (name.startswith('artifact-') and name.endswith('.json')):
+        return None
+    year: str = name[len('artifact-'):-len('.json')]
+    return int(year) if year.isdigit() else None
+
+
+def find_artifacts(directory: str) -> dict[int, str]:
+    """
+    :param directory: Directory holding artifact-<year>.json files
+    :return: BS year -> path of every artifact in the directory
+    """
+    artifacts: dict[int, str] = {}
+    for file in os.listdir(directory):
+        year: Optional[int] = artifact_year(file)
+        if year is not None:
+            artifacts[year] = os.path.join(directory, file)
+    return artifacts
+
+
+def _parse_date(value, name: str) -> tuple[int, int, int]:
+    try:
+        year, month, day = map(int, value.split('/'))
+    except (AttributeError, ValueError):
+        raise ValueError(f'{name} "{value}" is not a "yyyy/m/d" date') from None
+    if year < 0 or month < 0 or day < 0:
+        raise ValueError(f'{name} "{value}" is not a "yyyy/m/d" date')
+    return year, month, day
+
+
+def _parse_names(value, name: str) -> tuple[str, ...]:
+    # Checking the set of item types keeps the loop out of Python
+    if type(value) is not list or not set(map(type, value)) <= {str}:
+        raise ValueError(f'{name} has to be a list of strings')
+    return tuple(filter(None, value))
+
+
+def parse_day(eng_date: str, day: dict) -> ArtifactDay:
+    """
+    Validates and normalizes one entry of an artifact
+    :param eng_date: AD date key of the entry, "yyyy/m/d"
+    :param day: Entry of the artifact
+    :return: Normalized day
+    """
+    if not isinstance(day, dict):
+        raise ValueError('Entry has to be an object')
+    ad_year, ad_month, ad_day = _parse_date(eng_date, 'Date')
+    date(ad_year, ad_month, ad_day)
+    bs_year, bs_month, bs_day = _parse_date(day.get('nepali_date'), 'nepali_date')
+    if not 1 <= bs_month <= 12 or not 1 <= bs_day <= 32:
+        raise ValueError(f'nepali_date "{day["nepali_date"]}" is not a valid BS date')
+    if not isinstance(day.get('is_public_holiday'), bool):
+        raise ValueError('is_public_holiday has to be true or false')
+    if not isinstance(day.get('tithi'), str):
+        raise ValueError('tithi has to be a string')
+    return ArtifactDay(
+        serial(ad_year, ad_month, ad_day), serial(bs_year, bs_month, bs_day),
+        ad_year, ad_month, ad_day, bs_year, bs_month, bs_day,
+        day['is_public_holiday'], day['tithi'],
+        _parse_names(day.get('events'), 'events'),
+        _parse_names(day.get('panchangam'), 'panchangam')
+    )
+
+
+def parse_artifact(path: str) -> Artifact:
+    """
+    Reads and validates one artifact file, runs in the worker processes
+    :param path: Path of the artifact
+    :return: Artifact with its days sorted by AD serial
+    """
+    try:
+        with open(path, 'r') as af:
+            data = json.load(af)
+    except (OSError, ValueError) as e:
+        raise ArtifactError(f'Cannot read "{path}": {e}') from None
+    if not isinstance(data, dict):
+        raise ArtifactError(f'"{path}" has to hold an object of days')
+    year: Optional[int] = artifact_year(path)
+    days: list[ArtifactDay] = []
+    for eng_date, entry in data.items():
+        try:
+            day: ArtifactDay = parse_day(eng_date, entry)
+        except ValueError as e:
+            raise ArtifactError(f'Invalid day "{eng_date}" in "{path}": {e}') from None
+        if year is not None and day.bs_year != year:
+            raise ArtifactError(
+                f'Day "{eng_date}" in "{path}" is in BS year {day.bs_year}, '
+                f'not {year}'
+            )
+        days.append(day)
+    days.sort()
+    for previous, day in zip(days, days[1:]):
+        if previous.ad_sn == day.ad_sn or previous.bs_sn >= day.bs_sn:
+            raise ArtifactError(
+                f'Days {previous.ad_year}/{previous.ad_month}/{previous.ad_day} '
+                f'and {day.ad_year}/{day.ad_month}/{day.ad_day} in "{path}" '
+                f'overlap or are out of order'
+            )
+    return Artifact(path=path, year=year, days=days)
+
+
+def iter_artifacts(paths: Iterable[str],
+                   workers: int = 0) -> Iterator[Artifact]:
+    """
+    Parses artifacts in worker processes and hands them out in the given
+    order as soon as each one is ready, so the caller can import one while
+    the next ones are still being parsed
+    :param paths: Paths of the artifacts
+    :param workers: Number of worker processes, 0 for one per CPU and 1 to
+                    parse in this process
+    :return: Iterator over the parsed artifacts
+    :raises ArtifactError: An artifact is missing or invalid
+    """
+    paths = list(paths)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    size: int = sum(
+        os.path.getsize(path) for path in paths if os.path.isfile(path)
+    )
+    if workers <= 1 or size < PARALLEL_MIN_BYTES:
+        for path in paths:
+            yield parse_artifact(path)
+        return None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(parse_artifact, paths)
+
+
+def load_artifacts(paths: Iterable[str], workers: int = 0) -> list[Artifact]:
+    """
+    :param paths: Paths of the artifacts
+    :param workers: Number of worker processes, see iter_artifacts()
+    :return: Parsed artifacts in the given order
+    """
+    return list(iter_artifacts(paths, workers=workers))
+
+
+def artifact_sources(paths: Iterable[str]) -> list[Iterator[ArtifactDay]]:
+    """
+    Groups artifacts into sources for merge_days() without parsing them.
+    Consecutive paths of increasing BS years hold consecutive days, so every
+    such run is one source, parsing its files one at a time while it is read
+    :param paths: Paths of the artifacts, later ones replace the days of
+                  earlier ones
+    :return: Sources of days sorted by AD serial, in the order of the paths
+    """
+    runs: list[list[str]] = []
+    previous: Optional[int] = None
+    for path in paths:
+        year: Optional[int] = artifact_year(path)
+        if not runs or year is None or previous is None or year <= previous:
+            runs.append([])
+        runs[-1].append(path)
+        previous = year
+    return [
+        itertools.chain.from_iterable(
+            artifact.days for artifact in iter_artifacts(run, workers=1)
+        )
+        for run in runs
+    ]
+
+
+def merge_days(sources: Iterable[Iterable[ArtifactDay]]) -> Iterator[ArtifactDay]:
+    """
+    Merges sources of days lazily, later sources replace the days of
+    earlier ones with the same AD date. Every source is read once and only
+    its next day is held by the merge
+    :param sources: Days sorted by AD serial, such as the days of parsed
+                    artifacts or the sources of artifact_sources()
+    :return: Days sorted by AD serial
+    """
+    current: Optional[ArtifactDay] = None
+    # Days of the same date come in the order of their sources
+    for day, _ in heapq.merge(
+        *(zip(days, itertools.repeat(pos)) for pos, days in enumerate(sources)),
+        key=lambda item: (item[0].ad_sn, item[1])
+    ):
+        if current is not None and day.ad_sn != current.ad_sn:
+            yield current
+        current = day
+    if current is not None:
+        yield current
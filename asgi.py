@@ -0,0 +1,255 @@
+"""
+ASGI entry point for production serving, run it with
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8080
+
+or start the API with SERVER=asgi. The Flask application is executed on a
+thread pool, so the event loop keeps accepting connections while requests
+wait on the database, and responses are streamed back chunk by chunk.
+
+With WORKERS > 1, serve() imports the data once and then forks the worker
+processes, which share the calendar index copy-on-write and open the
+database read only.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import importlib.util
+import asyncio
+import signal
+import socket
+import gc
+import sys
+import os
+
+ASGI_THREADS: int = int(os.environ.get('ASGI_THREADS', 32))
+
+
+def load_server():
+    """
+    Imports __main__.py under its own module name so that the server can be
+    used without being the script that was started
+    :return: Server module
+    """
+    if 'npeventsapi' not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            'npeventsapi',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), '__main__.py')
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['npeventsapi'] = module
+        spec.loader.exec_module(module)
+    return sys.modules['npeventsapi']
+
+
+def build_environ(scope: dict, body: bytes) -> dict:
+    """
+    Translates an ASGI HTTP scope to a WSGI environment
+    :param scope: ASGI connection scope
+    :param body: Complete request body
+    :return: WSGI environment
+    """
+    server: tuple = scope.get('server') or ('localhost', 80)
+    client: tuple = scope.get('client') or ('', 0)
+    environ: dict = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').lower()
+        if name == 'content-type':
+            key: str = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = f'HTTP_{name.upper().replace("-", "_")}'
+        value = value.decode('latin1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class ASGIApplication:
+    """
+    Serves a WSGI application over ASGI without blocking the event loop
+    """
+
+    def __init__(self, server, threads: int = ASGI_THREADS):
+        """
+        :param server: Server module as returned by load_server()
+        :param threads: Number of requests handled concurrently
+        """
+        self.server = server
+        self.bootstrapped: bool = False
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='npeventsapi'
+        )
+
+    async def __call__(self, scope: dict, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return None
+        body: bytearray = bytearray()
+        while True:
+            message: dict = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                break
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self.executor, self.run_wsgi,
+            loop, build_environ(scope, bytes(body)), send
+        )
+        return None
+
+    async def lifespan(self, receive, send) -> None:
+        while True:
+            message: dict = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if not self.bootstrapped:
+                        await asyncio.get_running_loop().run_in_executor(
+                            self.executor, self.server.bootstrap
+                        )
+                        self.bootstrapped = True
+                except Exception as e:
+                    await send({
+                        'type': 'lifespan.startup.failed', 'message': str(e)
+                    })
+                    return None
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return None
+
+    def run_wsgi(self, loop, environ: dict, send) -> None:
+        """
+        Runs one request on a worker thread, handing every chunk of the
+        response to the event loop as soon as it is produced
+        """
+        status: list = []
+
+        def start_response(status_line: str, headers: list, exc_info=None):
+            status[:] = [
+                int(status_line.split(' ', 1)[0]),
+                [
+                    (name.lower().encode('latin1'), value.encode('latin1'))
+                    for name, value in headers
+                ]
+            ]
+
+        def emit(message: dict) -> None:
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started: bool = False
+        chunks = self.server.app.wsgi_app(environ, start_response)
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if not started:
+                    emit({
+                        'type': 'http.response.start',
+                        'status': status[0], 'headers': status[1]
+                    })
+                    started = True
+                emit({
+                    'type': 'http.response.body',
+                    'body': chunk, 'more_body': True
+                })
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        if not started:
+            emit({
+                'type': 'http.response.start',
+                'status': status[0], 'headers': status[1]
+            })
+        emit({'type': 'http.response.body', 'body': b''})
+
+
+app: ASGIApplication = ASGIApplication(load_server())
+
+
+def serve(host: str, port: int, workers: int = 1, debug: bool = False) -> None:
+    """
+    Serves the API with uvicorn. With more than one worker the artifacts are
+    imported once in this process, which then forks the workers on a shared
+    listening socket and restarts any worker that dies.
+    :param host: Host to listen on
+    :param port: Port to listen on
+    :param workers: Number of worker processes
+    :param debug: Verbose logging
+    :return:
+    """
+    import uvicorn
+    log_level: str = 'debug' if debug else 'info'
+    if workers <= 1:
+        uvicorn.run(app, host=host, port=port, log_level=log_level)
+        return None
+    app.server.bootstrap()
+    app.bootstrapped = True
+    app.server.enable_read_only()
+    sock: socket.socket = socket.socket(
+        socket.AF_INET6 if ':' in host else socket.AF_INET
+    )
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    # Keep the objects created while importing out of the collector, so
+    # that collections in the workers do not copy their pages. The calendar
+    # index is read from the memory mapped snapshot and is shared anyway
+    gc.freeze()
+    config = uvicorn.Config(
+        app, log_level=log_level, lifespan='off'
+    )
+
+    def spawn() -> int:
+        pid: int = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            uvicorn.Server(config).run(sockets=[sock])
+            os._exit(0)
+        return pid
+
+    children: set[int] = {spawn() for _ in range(workers)}
+    stopping: list[bool] = [False]
+
+    def stop(signum, frame) -> None:
+        stopping[0] = True
+        for child in children:
+            os.kill(child, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f'[I] Serving on {host}:{port} with {workers} worker processes')
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping[0]:
+            print(f'[W] Worker {pid} exited, starting a new one')
+            children.add(spawn())
+    return None
@@ -0,0 +1,97 @@
+"""
+Checks the date converter the server uses, the month table corrected with
+the imported days, against every day of the calendar table: both
+conversions, the serials and the month lengths must match the imported
+rows. Every day of the converter's table is also converted to the other
+calendar and back, which must return the same day. Disagreements between
+the month table in converter.py and the days are reported as warnings when
+the server loads them. For example
+
+    python benchmarks/converter_check.py -v
+"""
+from datetime import date, timedelta
+import argparse
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from asgi import load_server  # noqa: E402
+from converter import Converter  # noqa: E402
+
+
+def check_rows(converter: Converter, rows) -> list[str]:
+    """
+    :param converter: Converter to check
+    :param rows: Rows of the calendar table
+    :return: Descriptions of the rows the converter disagrees with
+    """
+    errors: list[str] = []
+    month_days: dict[tuple[int, int], int] = {}
+    for row in rows:
+        ad: tuple[int, int, int] = (row.ad_year, row.ad_month, row.ad_day)
+        bs: tuple[int, int, int] = (row.bs_year, row.bs_month, row.bs_day)
+        if bs[0] < converter.first_year or bs[0] > converter.last_year:
+            continue
+        month_days[bs[:2]] = max(month_days.get(bs[:2], 0), bs[2])
+        if converter.convert('ad', *ad) != bs:
+            errors.append(f'AD {ad} converts to {converter.convert("ad", *ad)}, expected {bs}')
+        if converter.convert('bs', *bs) != ad:
+            errors.append(f'BS {bs} converts to {converter.convert("bs", *bs)}, expected {ad}')
+        if converter.serials('bs', *bs) != (row.ad_sn, row.bs_sn):
+            errors.append(f'BS {bs} has serials {converter.serials("bs", *bs)}, expected {(row.ad_sn, row.bs_sn)}')
+    for (year, month), days in month_days.items():
+        known: int = converter.days_in_month('bs', year, month)
+        if known != days:
+            errors.append(f'BS {year}-{month} has {known} days, expected {days}')
+    return errors
+
+
+def check_round_trips(converter: Converter) -> tuple[int, list[str]]:
+    """
+    :param converter: Converter to check
+    :return: Number of days checked and descriptions of the failed ones
+    """
+    errors: list[str] = []
+    first: date = converter.epoch()
+    checked: int = 0
+    previous: tuple[int, int, int] = (0, 0, 0)
+    day: date = first
+    while True:
+        bs = converter.ad_to_bs(day.year, day.month, day.day)
+        if bs is None:
+            break
+        if converter.bs_to_ad(*bs) != (day.year, day.month, day.day):
+            errors.append(f'AD {day} -> BS {bs} -> AD {converter.bs_to_ad(*bs)}')
+        if bs <= previous:
+            errors.append(f'AD {day} -> BS {bs} does not follow BS {previous}')
+        previous = bs
+        checked += 1
+        day += timedelta(days=1)
+    before: date = first - timedelta(days=1)
+    if converter.ad_to_bs(before.year, before.month, before.day) is not None:
+        errors.append('The day before the table converts')
+    return checked, errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print a summary of the checks')
+    args = parser.parse_args()
+    server = load_server()
+    server.bootstrap()
+    with server.app.app_context():
+        rows = server.db.session.execute(server.db.select(
+            server.Calendar.ad_sn, server.Calendar.bs_sn,
+            server.Calendar.ad_year, server.Calendar.ad_month, server.Calendar.ad_day,
+            server.Calendar.bs_year, server.Calendar.bs_month, server.Calendar.bs_day
+        )).all()
+    converter: Converter = server.converter
+    errors: list[str] = check_rows(converter, rows)
+    days, round_trip_errors = check_round_trips(converter)
+    errors += round_trip_errors
+    for error in errors:
+        print(f'[E] {error}')
+    if args.verbose:
+        print(f'[I] {len(rows)} calendar rows and {days} round trips of BS '
+              f'{converter.first_year} to {converter.last_year} checked')
+    sys.exit(1 if errors else 0)
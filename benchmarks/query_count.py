@@ -0,0 +1,90 @@
+"""
+Counts the SQL statements every request issues once the server is warm.
+Calendar variables, month lengths and conversions are answered from
+memory and the events of the days from the snapshot, so only the calendar
+queries themselves remain, one per date or range. Requests over the budget
+fail the check, for example
+
+    python benchmarks/query_count.py -v
+"""
+import argparse
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from asgi import load_server  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+# (method, path, JSON body)
+REQUESTS: list[tuple[str, str, dict]] = [
+    ('GET', '/v2/date/bs/@today', None),
+    ('GET', '/v2/date/bs/@cur_year-@cur_month', None),
+    ('GET', '/v2/date/ad/@cur_year-@cur_month-@cur_day', None),
+    ('GET', '/v2/date/bs/@ignore-1-1', None),
+    ('GET', '/v2/range/bs/from/@today/to/@cur_year-12-0', None),
+    ('GET', '/v2/range/ad/from/@cur_year-@cur_month-1/to/@today?only_holidays=1', None),
+    ('GET', '/v2/range/bs/from/@cur_year/to/@cur_year?format=ndjson', None),
+    ('POST', '/v2/batch', {'queries': [
+        {'caltype': 'bs', 'date': '@today'},
+        {'caltype': 'bs', 'from': '@cur_year-1-1', 'to': '@today'},
+        {'caltype': 'ad', 'from': '@today', 'to': '@cur_year-12-31'},
+    ]}),
+]
+
+
+def count_statements(server, method: str, path: str, body: dict) -> tuple[int, int]:
+    """
+    :return: Status code and number of statements run by the request
+    """
+    statements: list[str] = []
+
+    def record(connection, cursor, statement, *args):
+        statements.append(statement)
+    with server.app.app_context():
+        engines: list = list(server.db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = server.app.test_client().open(
+            path, method=method, json=body,
+            headers={'Cache-Control': 'no-cache'}
+        )
+        response.get_data()
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', record)
+    return response.status_code, len(statements)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max', type=int, default=1, help='Statements allowed per calendar query')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print every request')
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    args = parser.parse_args()
+    server = load_server()
+    server.bootstrap()
+    results: list[dict] = []
+    for method, path, body in REQUESTS:
+        # The first request fills the caches, the second one is measured
+        count_statements(server, method, path, body)
+        server.response_cache.clear()
+        server.compressed_cache.clear()
+        status, statements = count_statements(server, method, path, body)
+        queries: int = len(body['queries']) if body else 1
+        results.append({
+            'request': f'{method} {path}', 'status': status,
+            'statements': statements,
+            'over_budget': statements > args.max * queries
+        })
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for r in results:
+            if args.verbose or r['over_budget']:
+                print(
+                    f'[{"E" if r["over_budget"] else "I"}] {r["request"]}: '
+                    f'{r["statements"]} statements (HTTP {r["status"]})'
+                )
+    sys.exit(1 if any(r['over_budget'] for r in results) else 0)
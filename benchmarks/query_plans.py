@@ -0,0 +1,117 @@
+"""
+Checks the SQLite query plans of the hot queries. Every query must be
+answered through indexes, a full table scan of calendar, events or
+calendar_event_relationship that is not expected fails the check, for
+example
+
+    python benchmarks/query_plans.py -v
+"""
+import argparse
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from asgi import load_server  # noqa: E402
+
+TABLES: tuple[str, ...] = ('calendar', 'events', 'calendar_event_relationship')
+
+
+def hot_queries(server) -> list[tuple]:
+    """
+    :return: (label, statement[, tables the planner may scan]) of every query
+    """
+    Calendar = server.Calendar
+    Events = server.Events
+    Relationship = server.CalendarEventRelationship
+    db = server.db
+    return [
+        ('date view, day', server.calender_query_builder(
+            caltype='bs', start=(2080, 1, 1)
+        )),
+        ('date view, month', server.calender_query_builder(
+            caltype='ad', start=(2023, 4, 0)
+        )),
+        # A year is a tenth of the days, walking the table in id order is
+        # faster than the index as it saves sorting for the GROUP BY
+        ('date view, year', server.calender_query_builder(
+            caltype='bs', start=(2080, 0, 0)
+        ), ('calendar',)),
+        ('range view', server.calender_query_builder(
+            caltype='ad', start=(2023, 4, 1), end=(2023, 5, 30)
+        )),
+        ('range view, tithis', server.calender_query_builder(
+            caltype='bs', start=(2080, 1, 1), end=(2080, 6, 30),
+            filter_tithis=['एकादशी']
+        )),
+        ('days in month', db.select(db.func.count(Calendar.id)).where(
+            Calendar.bs_year == 2080, Calendar.bs_month == 1
+        )),
+        ('day events', db.select(
+            Relationship.day_id, Events.event_class, Events.event_name
+        ).join(Events, Relationship.event_id == Events.id)
+         .where(Relationship.day_id.in_([1, 2, 3]))
+         .order_by(Relationship.id)),
+        ('event lookup', db.select(Events.id).where(
+            Events.event_class == 'tithi', Events.event_name == 'एकादशी'
+        )),
+        ('days of an event', db.select(Relationship.day_id).where(
+            Relationship.event_id == 1
+        )),
+        ('import, existing relations', db.select(
+            Relationship.day_id, Relationship.event_id
+        ).join(Calendar, Calendar.id == Relationship.day_id)
+         .where(Calendar.ad_sn.between(20230414, 20240412))),
+        ('sync, days of a year', db.select(Calendar.id).where(
+            Calendar.bs_year == 2080
+        )),
+    ]
+
+
+def query_plan(server, statement) -> list[str]:
+    compiled = statement.compile(
+        dialect=server.db.engine.dialect,
+        compile_kwargs={'literal_binds': True}
+    )
+    return [
+        row[-1] for row in server.db.session.execute(
+            server.db.text(f'EXPLAIN QUERY PLAN {compiled}')
+        ).all()
+    ]
+
+
+def full_scans(plan: list[str], allowed: tuple[str, ...] = ()) -> list[str]:
+    return [
+        step for step in plan
+        if step.startswith('SCAN ') and step.split()[1] in TABLES
+        and step.split()[1] not in allowed
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print every plan')
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    args = parser.parse_args()
+    server = load_server()
+    server.bootstrap()
+    results: list[dict] = []
+    with server.app.app_context():
+        if server.db.engine.dialect.name != 'sqlite':
+            print('[E] Query plans can only be checked on SQLite')
+            sys.exit(1)
+        for label, statement, *allowed in hot_queries(server):
+            plan: list[str] = query_plan(server, statement)
+            results.append({
+                'query': label, 'plan': plan,
+                'full_scans': full_scans(plan, *allowed)
+            })
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False))
+    else:
+        for r in results:
+            print(f'[{"E" if r["full_scans"] else "I"}] {r["query"]}')
+            if args.verbose or r['full_scans']:
+                for step in r['plan']:
+                    print(f'      {step}')
+    sys.exit(1 if any(r['full_scans'] for r in results) else 0)
@@ -0,0 +1,70 @@
+"""
+Counts the SQL statements of cold /v2/range requests on the plain SQL path,
+with the snapshot disabled and every cache emptied before each request.
+The days of a range and their events are each read with one statement, so
+the count must not grow with the size of the range: a one year range has
+to run as many statements as a single day. For example
+
+    python benchmarks/range_statements.py -v
+"""
+import argparse
+import json
+import sys
+import os
+
+# Read when the server is imported
+os.environ['USE_SNAPSHOT'] = '0'
+os.environ['QUERY_ENGINE'] = 'sql'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from asgi import load_server  # noqa: E402
+from query_count import count_statements  # noqa: E402
+
+# (label, path), the one year range is the one that has to stay constant
+RANGES: list[tuple[str, str]] = [
+    ('day', '/v2/range/bs/from/2080-1-1/to/2080-1-1'),
+    ('month', '/v2/range/bs/from/2080-1/to/2080-1'),
+    ('one year', '/v2/range/bs/from/2080/to/2080'),
+    ('one year, ad', '/v2/range/ad/from/2023-1-1/to/2023-12-31'),
+]
+
+
+def clear_caches(server) -> None:
+    for cache in (server.response_cache, server.compressed_cache,
+                  server.day_fragments, server.encoded_days):
+        cache.clear()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max', type=int, default=2, help='Statements allowed per range')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print every request')
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    args = parser.parse_args()
+    server = load_server()
+    server.bootstrap()
+    results: list[dict] = []
+    for label, path in RANGES:
+        clear_caches(server)
+        status, statements = count_statements(server, 'GET', path, None)
+        results.append({
+            'range': label, 'request': path, 'status': status,
+            'statements': statements,
+        })
+    counts: set[int] = {r['statements'] for r in results}
+    failed: bool = len(counts) != 1 or max(counts) > args.max \
+        or any(r['status'] != 200 for r in results)
+    if args.json:
+        print(json.dumps({'results': results, 'failed': failed}))
+    else:
+        for r in results:
+            if args.verbose or failed:
+                print(
+                    f'[{"E" if failed else "I"}] {r["range"]}: {r["statements"]} '
+                    f'statements (HTTP {r["status"]})'
+                )
+        if len(counts) != 1:
+            print('[E] The number of statements depends on the size of the range')
+        elif max(counts) > args.max:
+            print(f'[E] Ranges run {max(counts)} statements, more than {args.max}')
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,118 @@
+"""
+Compares the ways a date or range response can be serialized: the nested
+dict through every available encoder, the document assembled from the
+pre-encoded day payloads, as MessagePack and with a fields projection.
+Reports the best time, the peak memory allocated while serializing and the
+size of the payload, for example
+
+    python benchmarks/serialization.py -n 20
+"""
+import argparse
+import tracemalloc
+import time
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from asgi import load_server  # noqa: E402
+from encoder import ENCODERS, msgpack  # noqa: E402
+
+PROJECTION: tuple[str, ...] = ('public_holiday', 'tithi')
+
+RANGES: list[tuple[str, str, tuple, tuple]] = [
+    ('one year', 'bs', (2080, 0, 0), (2080, 0, 0)),
+    ('ten years', 'bs', (2076, 0, 0), (2085, 0, 0)),
+]
+
+
+def best_of(repeat: int, func) -> float:
+    best: float = float('inf')
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def peak_allocated(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--repeat', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    args = parser.parse_args()
+    server = load_server()
+    server.bootstrap()
+    results: list[dict] = []
+    with server.app.app_context():
+        for label, caltype, start, end in RANGES:
+            rows: list = server.find_calendar_days(
+                caltype=caltype, start=start, end=end
+            )
+            expected: dict = json.loads(
+                ENCODERS['json'](server.calender_result_to_dict(rows))
+            )
+            projected: dict = {
+                yyyy: {
+                    mm: {
+                        dd: {field: day[field] for field in PROJECTION}
+                        for dd, day in days.items()
+                    }
+                    for mm, days in months.items()
+                }
+                for yyyy, months in expected.items()
+            }
+            # name -> (serialize, decode, expected document)
+            cases: dict = {
+                f'dict + {name}': (
+                    lambda dumps=dumps: dumps(
+                        server.calender_result_to_dict(rows)
+                    ),
+                    json.loads, expected
+                )
+                for name, dumps in ENCODERS.items()
+            }
+            cases['pre-encoded days'] = (
+                lambda: server.calender_result_to_bytes(rows),
+                json.loads, expected
+            )
+            cases['fields projection'] = (
+                lambda: server.calender_result_to_bytes(
+                    rows, fields=PROJECTION
+                ),
+                json.loads, projected
+            )
+            if msgpack is not None:
+                cases['msgpack'] = (
+                    lambda: server.calender_result_to_bytes(
+                        rows, media='msgpack'
+                    ),
+                    msgpack.unpackb, expected
+                )
+            for case, (func, decode, document) in cases.items():
+                if decode(func()) != document:
+                    print(f'[E] "{case}" returned a different document for {label}')
+                    sys.exit(1)
+                results.append({
+                    'range': label, 'case': case, 'days': len(rows),
+                    'ms': best_of(args.repeat, func) * 1000,
+                    'allocated_kib': peak_allocated(func) / 1024,
+                    'size_kib': len(func()) / 1024,
+                })
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f'{"range":<10} {"case":<18} {"days":>5} {"ms":>8} {"peak KiB":>9} {"size KiB":>9}')
+        for r in results:
+            print(
+                f'{r["range"]:<10} {r["case"]:<18} {r["days"]:>5} '
+                f'{r["ms"]:>8.2f} {r["allocated_kib"]:>9.1f} {r["size_kib"]:>9.1f}'
+            )
@@ -0,0 +1,266 @@
+"""
+Benchmark suite for the importer and the /v2 API on synthetic data. Writes
+artifacts for the given number of BS years into a scratch directory,
+imports them into a new SQLite database, times date and range requests of
+every size with each filter through the Flask test client, and runs the
+HTTP load generator of throughput.py against a local server. Results can
+be saved and later runs compared against them, for example
+
+    python benchmarks/suite.py -y 20 -o baseline.json
+    python benchmarks/suite.py -y 20 -b baseline.json
+
+Comparing fails when a measurement got slower than the baseline by more
+than the tolerance. Baselines are only comparable on the same machine with
+the same number of years.
+"""
+from datetime import date, timedelta
+from urllib.parse import quote
+import argparse
+import platform
+import logging
+import tempfile
+import shutil
+import threading
+import random
+import time
+import json
+import sys
+import os
+
+# Read when the server is imported
+WORK_DIR: str = tempfile.mkdtemp(prefix='npeventsapi-bench-')
+os.environ['DATABASE_URI'] = f'sqlite:///{os.path.join(WORK_DIR, "calendar.db")}'
+os.environ['ARTIFACTS_DIR'] = os.path.join(WORK_DIR, 'artifacts')
+os.environ.pop('DATABASE_REPLICAS', None)
+os.environ.pop('SKIP_DB_CREATE', None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from asgi import load_server  # noqa: E402
+from converter import BS_EPOCH, BS_MONTH_DAYS  # noqa: E402
+from throughput import run_load  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+TITHIS: tuple[str, ...] = (
+    'प्रतिपदा', 'द्वितीया', 'तृतीया', 'चतुर्थी', 'पञ्चमी', 'षष्ठी', 'सप्तमी',
+    'अष्टमी', 'नवमी', 'दशमी', 'एकादशी', 'द्वादशी', 'त्रयोदशी', 'चतुर्दशी'
+)
+FILTERS: list[tuple[str, str]] = [
+    ('none', ''),
+    ('only_holidays', 'only_holidays=1'),
+    ('except_holidays', 'except_holidays=1'),
+    ('filter_tithis', f'filter_tithis={quote("एकादशी;पूर्णिमा")}'),
+    ('search', f'search={quote("%दिवस%")}'),
+    # The search applies to the tithi events then
+    ('tithis+search', f'filter_tithis={quote("एकादशी;पूर्णिमा")}&search={quote("%एका%")}'),
+]
+# Measurements compared against the baseline -> whether larger is better
+COMPARED: dict[str, bool] = {'ms': False, 'p95_ms': False, 'rps': True}
+
+
+def synthetic_day(rng: random.Random, number: int) -> dict:
+    """
+    :param rng: Random generator, seeded for repeatable artifacts
+    :param number: Days since the first synthetic day
+    :return: Artifact entry without its date
+    """
+    phase: int = number % 30
+    tithi: str = TITHIS[phase % 15] if phase % 15 < 14 \
+        else ('पूर्णिमा' if phase < 15 else 'औंसी')
+    events: list[str] = [
+        f'उत्सव {rng.randrange(400)}' + (' दिवस' if rng.random() < 0.3 else '')
+        for _ in range(rng.choice((0, 0, 1, 1, 2, 3)))
+    ]
+    return {
+        'events': events,
+        'panchangam': [f'पञ्चाङ्ग {tithi}', f'योग {rng.randrange(27)}'],
+        'tithi': tithi,
+        'is_public_holiday': bool(events) and rng.random() < 0.15,
+    }
+
+
+def write_artifacts(directory: str, years: int, first_year: int,
+                    seed: int = 0) -> int:
+    """
+    Writes artifact-<year>.json files of synthetic days. Month lengths are
+    taken round robin from the converter's table
+    :param directory: Directory to write to
+    :param years: Number of BS years
+    :param first_year: First BS year
+    :param seed: Seed of the random events
+    :return: Number of days written
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng: random.Random = random.Random(seed)
+    tables: list[tuple[int, ...]] = list(BS_MONTH_DAYS.values())
+    day: date = BS_EPOCH + timedelta(days=round((first_year - min(BS_MONTH_DAYS)) * 365.25))
+    number: int = 0
+    for year in range(first_year, first_year + years):
+        artifact: dict[str, dict] = {}
+        for month, month_days in enumerate(tables[(year - min(BS_MONTH_DAYS)) % len(tables)], start=1):
+            for month_day in range(1, month_days + 1):
+                entry: dict = synthetic_day(rng, number)
+                entry['nepali_date'] = f'{year}/{month}/{month_day}'
+                artifact[f'{day.year}/{day.month}/{day.day}'] = entry
+                day += timedelta(days=1)
+                number += 1
+        with open(os.path.join(directory, f'artifact-{year}.json'), 'w') as af:
+            json.dump(artifact, af, ensure_ascii=False)
+    return number
+
+
+def request_paths(first_year: int, years: int) -> list[tuple[str, str]]:
+    """
+    :return: (label, path) of every request, each size with every filter
+    """
+    middle: int = first_year + years // 2
+    last: int = min(first_year + 9, first_year + years - 1)
+    sizes: list[tuple[str, str]] = [
+        ('date', f'/v2/date/bs/{middle}-5-15'),
+        ('month', f'/v2/date/bs/{middle}-5'),
+        ('year', f'/v2/range/bs/from/{middle}/to/{middle}'),
+        ('decade', f'/v2/range/bs/from/{first_year}/to/{last}'),
+    ]
+    return [
+        (f'{size} / {filter_label}', f'{path}?{query}' if query else path)
+        for size, path in sizes for filter_label, query in FILTERS
+    ]
+
+
+def time_request(server, path: str, repeat: int) -> dict:
+    """
+    Times a request with the response caches emptied before every run, so
+    the query and the assembly of the response are measured
+    :return: Best and median time in milliseconds, status and size
+    """
+    client = server.app.test_client()
+    times: list[float] = []
+    for _ in range(repeat):
+        server.response_cache.clear()
+        server.compressed_cache.clear()
+        started: float = time.perf_counter()
+        response = client.get(path, headers={'Accept-Encoding': 'identity'})
+        body: bytes = response.get_data()
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return {
+        'ms': times[len(times) // 2] * 1000, 'best_ms': times[0] * 1000,
+        'status': response.status_code, 'bytes': len(body)
+    }
+
+
+def time_import(server) -> dict:
+    """
+    Times the first import of the artifacts and a restart finding them
+    unchanged
+    """
+    started: float = time.perf_counter()
+    server.bootstrap()
+    imported: float = time.perf_counter() - started
+    server.invalidate_calendar_index()
+    started = time.perf_counter()
+    server.bootstrap()
+    return {
+        'import': {'ms': imported * 1000},
+        'restart': {'ms': (time.perf_counter() - started) * 1000},
+    }
+
+
+def load_test(server, paths: list[str], concurrency: int,
+              duration: float) -> dict:
+    """
+    Serves the application on a local port in a thread and generates load
+    against it
+    """
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    httpd = make_server('127.0.0.1', 0, server.app, threaded=True)
+    thread: threading.Thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        result: dict = run_load(
+            f'http://127.0.0.1:{httpd.server_port}', paths, concurrency, duration
+        )
+    finally:
+        httpd.shutdown()
+    return {
+        'rps': result['rps'], 'p50_ms': result['p50_ms'],
+        'p95_ms': result['p95_ms'], 'errors': result['errors']
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    :param results: Measurements of this run
+    :param baseline: Measurements of the baseline run
+    :param tolerance: Allowed slowdown, 0.25 for 25%
+    :return: Descriptions of the regressions
+    """
+    regressions: list[str] = []
+    for name, measured in results.items():
+        for key, value in measured.items():
+            if key not in COMPARED:
+                continue
+            previous = baseline.get(name, {}).get(key)
+            if not previous or not value:
+                continue
+            slowdown: float = previous / value if COMPARED[key] \
+                else value / previous
+            if slowdown > 1 + tolerance:
+                regressions.append(
+                    f'{name} {key}: {value:.2f}, baseline {previous:.2f} '
+                    f'({(slowdown - 1) * 100:.0f}% worse)'
+                )
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-y', '--years', type=int, default=10, help='Synthetic BS years to generate')
+    parser.add_argument('--first-year', type=int, default=min(BS_MONTH_DAYS), help='First synthetic BS year')
+    parser.add_argument('-n', '--repeat', type=int, default=10, help='Runs of every request')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='Connections of the load test')
+    parser.add_argument('-d', '--duration', type=float, default=5, help='Seconds of the load test, 0 to skip it')
+    parser.add_argument('-o', '--output', help='Write the results as JSON to this file')
+    parser.add_argument('-b', '--baseline', help='Compare against the results in this file')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.25, help='Allowed slowdown against the baseline')
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    args = parser.parse_args()
+    baseline: dict = {}
+    if args.baseline:
+        with open(args.baseline, 'r') as bf:
+            baseline = json.load(bf)
+    days: int = write_artifacts(os.environ['ARTIFACTS_DIR'], args.years, args.first_year)
+    server = load_server()
+    server.app.instance_path = WORK_DIR
+    results: dict[str, dict] = time_import(server)
+    paths: list[tuple[str, str]] = request_paths(args.first_year, args.years)
+    for label, path in paths:
+        results[label] = time_request(server, path, args.repeat)
+    if args.duration > 0:
+        results['load'] = load_test(
+            server, [path for _, path in paths], args.concurrency, args.duration
+        )
+    report: dict = {
+        'years': args.years, 'days': days, 'python': platform.python_version(),
+        'machine': platform.machine(), 'cpus': os.cpu_count(), 'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as of:
+            json.dump(report, of, indent=2, ensure_ascii=False)
+    if baseline and baseline.get('years') != args.years:
+        print(f'[W] The baseline was measured on {baseline.get("years")} years, not {args.years}')
+    regressions: list[str] = compare(
+        results, baseline.get('results', {}), args.tolerance
+    ) if baseline else []
+    if args.json:
+        print(json.dumps({**report, 'regressions': regressions}, ensure_ascii=False))
+    else:
+        print(f'[I] {args.years} years, {days} days')
+        for name, measured in results.items():
+            print(f'{name:<32} ' + ' '.join(
+                f'{key} {value:.2f}' if isinstance(value, float) else f'{key} {value}'
+                for key, value in measured.items()
+            ))
+        for regression in regressions:
+            print(f'[E] {regression}')
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+    sys.exit(1 if regressions else 0)
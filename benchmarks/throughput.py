@@ -0,0 +1,117 @@
+"""
+Small HTTP load generator used to compare serving modes, for example
+
+    python benchmarks/throughput.py http://127.0.0.1:8080 -c 32 -d 10
+
+Every worker thread keeps one connection open and requests the given paths
+in a loop. Prints requests per second and latency percentiles.
+"""
+from urllib.parse import urlsplit
+import http.client
+import argparse
+import threading
+import time
+import json
+
+DEFAULT_PATHS: list[str] = [
+    '/v2/date/ad/@today',
+    '/v2/date/bs/@today',
+    '/v2/date/bs/2080-1',
+    '/v2/range/bs/from/2080-1-1/to/2080-3-0',
+    '/v2/range/ad/from/2023-5-15/to/2023-5-17?only_holidays=1',
+]
+
+
+def run_load(base_url: str, paths: list[str], concurrency: int,
+             duration: float) -> dict:
+    """
+    Generates load against a running server
+    :param base_url: Server URL such as http://127.0.0.1:8080
+    :param paths: Request paths, requested round robin by every worker
+    :param concurrency: Number of concurrent connections
+    :param duration: Seconds to run for
+    :return: Result summary
+    """
+    url = urlsplit(base_url)
+    latencies: list[float] = []
+    errors: list[int] = [0]
+    lock: threading.Lock = threading.Lock()
+    deadline: float = time.perf_counter() + duration
+
+    def worker(offset: int) -> None:
+        local: list[float] = []
+        failed: int = 0
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80)
+        i: int = offset
+        while time.perf_counter() < deadline:
+            started: float = time.perf_counter()
+            try:
+                conn.request('GET', paths[i % len(paths)])
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+                if response.getheader('connection', '').lower() == 'close':
+                    conn.close()
+                    conn = http.client.HTTPConnection(url.hostname, url.port or 80)
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80)
+            local.append(time.perf_counter() - started)
+            i += 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started: float = time.perf_counter()
+    threads: list[threading.Thread] = [
+        threading.Thread(target=worker, args=(n,)) for n in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed: float = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+
+    return {
+        'url': base_url,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='HTTP load generator for npEventsAPI')
+    parser.add_argument('url', help='Base URL of a running server')
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('-d', '--duration', type=float, default=10)
+    parser.add_argument(
+        '-p', '--path', dest='paths', action='append',
+        help='Path to request, can be given multiple times'
+    )
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    args = parser.parse_args()
+    result: dict = run_load(
+        args.url, args.paths or DEFAULT_PATHS, args.concurrency, args.duration
+    )
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(
+            f'[I] {result["requests"]} requests, {result["errors"]} errors, '
+            f'{result["rps"]:.1f} req/s, p50 {result["p50_ms"]:.1f}ms, '
+            f'p95 {result["p95_ms"]:.1f}ms, p99 {result["p99_ms"]:.1f}ms'
+        )
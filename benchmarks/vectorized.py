@@ -0,0 +1,96 @@
+"""
+Compares the SQL and the NumPy query engines on the imported calendar.
+Every case is run on both engines, results must be identical, then each
+engine is timed, for example
+
+    python benchmarks/vectorized.py -n 20
+"""
+import argparse
+import itertools
+import time
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from asgi import load_server  # noqa: E402
+from vectorized import VectorEngine  # noqa: E402
+
+RANGES: list[tuple[str, str, tuple, tuple]] = [
+    ('bs month', 'bs', (2080, 1, 0), (2080, 1, 0)),
+    ('bs year', 'bs', (2080, 0, 0), (2080, 0, 0)),
+    ('bs decade', 'bs', (2076, 0, 0), (2085, 0, 0)),
+    ('ad decade', 'ad', (2019, 5, 0), (2029, 3, 0)),
+]
+FILTERS: list[tuple[str, dict]] = [
+    ('none', {}),
+    ('only_holidays', {'only_holidays': True}),
+    ('except_holidays', {'except_holidays': True}),
+    ('filter_tithis', {'filter_tithis': ['एकादशी', 'पूर्णिमा']}),
+    ('search', {'search_event': '%दिवस%'}),
+    ('tithis+search', {
+        'filter_tithis': ['एकादशी'], 'search_event': '%एकादशी%'
+    }),
+]
+
+
+def best_of(repeat: int, func) -> float:
+    best: float = float('inf')
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--repeat', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    args = parser.parse_args()
+    server = load_server()
+    server.bootstrap()
+    results: list[dict] = []
+    with server.app.app_context():
+        index = server.get_calendar_index()
+        engine: VectorEngine = VectorEngine(index.snapshot)
+        for (label, caltype, start, end), (filter_label, filters) in \
+                itertools.product(RANGES, FILTERS):
+            query_args: dict = {
+                'caltype': caltype, 'start': start, 'end': end, **filters
+            }
+
+            def run_sql() -> list[int]:
+                return [
+                    row[0].id for row in server.db.session.execute(
+                        server.calender_query_builder(**query_args)
+                    ).all()
+                ]
+
+            def run_numpy() -> list[int]:
+                return [
+                    index[pos].id for pos in engine.select(
+                        server.parse_calendar_query(**query_args)
+                    )
+                ]
+
+            expected: list[int] = run_sql()
+            if run_numpy() != expected:
+                print(f'[E] Engines disagree for {label} / {filter_label}')
+                sys.exit(1)
+            sql_time: float = best_of(args.repeat, run_sql)
+            numpy_time: float = best_of(args.repeat, run_numpy)
+            results.append({
+                'range': label, 'filter': filter_label, 'days': len(expected),
+                'sql_ms': sql_time * 1000, 'numpy_ms': numpy_time * 1000,
+                'speedup': sql_time / numpy_time,
+            })
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f'{"range":<10} {"filter":<16} {"days":>5} {"sql ms":>8} {"numpy ms":>9} {"speedup":>8}')
+        for r in results:
+            print(
+                f'{r["range"]:<10} {r["filter"]:<16} {r["days"]:>5} '
+                f'{r["sql_ms"]:>8.2f} {r["numpy_ms"]:>9.2f} {r["speedup"]:>7.1f}x'
+            )
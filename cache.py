@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """
+    Thread safe mapping that keeps at most `maxsize` entries, and optionally
+    at most `maxbytes` bytes of entries, evicting the least recently used
+    one first
+    """
+
+    def __init__(self, maxsize: int = 1024, maxbytes: int = 0):
+        """
+        :param maxsize: Maximum number of entries, 0 disables the cache
+        :param maxbytes: Maximum total size of the entries as given to
+                         put(), 0 for no limit
+        """
+        self.maxsize: int = maxsize
+        self.maxbytes: int = maxbytes
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self._data: OrderedDict = OrderedDict()
+        self._sizes: dict[Hashable, int] = {}
+        self._lock: Lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the cached value and marks it as recently used
+        :param key: Cache key
+        :param default: Value returned when key is not cached
+        :return:
+        """
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self._data[key]
+
+    def get_many(self, keys: list[Hashable], default: Any = None) -> list:
+        """
+        Looks up several keys at once, taking the lock only once
+        :param keys: Cache keys
+        :param default: Value returned for keys that are not cached
+        :return: Values in the same order as keys
+        """
+        values: list = []
+        with self._lock:
+            for key in keys:
+                try:
+                    self._data.move_to_end(key)
+                except KeyError:
+                    self.misses += 1
+                    values.append(default)
+                    continue
+                self.hits += 1
+                values.append(self._data[key])
+        return values
+
+    def put(self, key: Hashable, value: Any, size: int = 0) -> None:
+        """
+        Stores a value, evicting the least recently used entries when over
+        the limits
+        :param key: Cache key
+        :param value: Value to cache
+        :param size: Size of the value in bytes, counted against maxbytes
+        :return:
+        """
+        if self.maxsize <= 0 or (self.maxbytes > 0 and size > self.maxbytes):
+            return None
+        with self._lock:
+            self.size += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize or \
+                    (self.maxbytes > 0 and self.size > self.maxbytes):
+                evicted, _ = self._data.popitem(last=False)
+                self.size -= self._sizes.pop(evicted)
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.size = 0
@@ -0,0 +1,128 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+
+class CalendarDay(NamedTuple):
+    id: int
+    ad_sn: int
+    bs_sn: int
+    ad_year: int
+    ad_month: int
+    ad_day: int
+    bs_year: int
+    bs_month: int
+    bs_day: int
+    is_holiday: bool
+
+
+class CalendarIndex:
+    """
+    Immutable index of the calendar table. Days are kept as columns sorted
+    by their AD serial, which keeps the BS serials sorted as well, so
+    conversions and month lengths are binary searches that never touch the
+    database. Built from a snapshot, the columns are its memory mapped
+    arrays, so every process reads the same pages and holds no copy of the
+    days. Days only become CalendarDay tuples when they are looked up.
+    """
+    __slots__ = ('_ids', '_ad_sn', '_bs_sn', '_holiday', 'version',
+                 'last_modified', 'snapshot')
+
+    def __init__(self, days: Iterable[tuple] = (), version: str = '',
+                 last_modified: Optional[datetime] = None, snapshot=None):
+        """
+        Builds the index
+        :param days: Rows in CalendarDay field order, in any order. Not
+                     used when a snapshot is given
+        :param version: Identifier that changes whenever the data changes
+        :param last_modified: When the data was last changed
+        :param snapshot: Snapshot to read the days from, if any
+        """
+        self.version: str = version
+        self.last_modified: Optional[datetime] = last_modified
+        self.snapshot = snapshot
+        if snapshot is not None:
+            self._ids = snapshot.ids
+            self._ad_sn = snapshot.ad_sn
+            self._bs_sn = snapshot.bs_sn
+            self._holiday = snapshot.holiday
+            return None
+        rows: list[tuple] = sorted(days, key=lambda day: day[1])
+        self._ids = array('i', (day[0] for day in rows))
+        self._ad_sn = array('i', (day[1] for day in rows))
+        self._bs_sn = array('i', (day[2] for day in rows))
+        self._holiday = array('B', (bool(day[9]) for day in rows))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[CalendarDay]:
+        return (self[pos] for pos in range(len(self)))
+
+    def __getitem__(self, pos: int) -> CalendarDay:
+        ad_sn: int = self._ad_sn[pos]
+        bs_sn: int = self._bs_sn[pos]
+        return CalendarDay(
+            self._ids[pos], ad_sn, bs_sn,
+            ad_sn // 10000, ad_sn // 100 % 100, ad_sn % 100,
+            bs_sn // 10000, bs_sn // 100 % 100, bs_sn % 100,
+            bool(self._holiday[pos])
+        )
+
+    @staticmethod
+    def serial(year: int, month: int, day: int) -> int:
+        return int(f'{year}{month:02d}{day:02d}')
+
+    def get(self, caltype: str, year: int, month: int,
+            day: int) -> Optional[CalendarDay]:
+        """
+        Looks up a single day
+        :param caltype: Calendar system of the given date, 'ad' or 'bs'
+        :param year: Year
+        :param month: Month
+        :param day: Day of month
+        :return: The day or None if it is not in the index
+        """
+        serials = self._ad_sn if caltype == 'ad' else self._bs_sn
+        sn: int = self.serial(year, month, day)
+        pos: int = bisect_left(serials, sn)
+        if pos < len(serials) and serials[pos] == sn:
+            return self[pos]
+        return None
+
+    def convert(self, caltype: str, year: int, month: int,
+                day: int) -> Optional[tuple[int, int, int]]:
+        """
+        Converts a date to the other calendar system
+        :param caltype: Calendar system of the given date, 'ad' or 'bs'
+        :param year: Year
+        :param month: Month
+        :param day: Day of month
+        :return: (year, month, day) in the other calendar or None
+        """
+        found: Optional[CalendarDay] = self.get(caltype, year, month, day)
+        if found is None:
+            return None
+        if caltype == 'ad':
+            return found.bs_year, found.bs_month, found.bs_day
+        return found.ad_year, found.ad_month, found.ad_day
+
+    def days_in_month(self, caltype: str, year: int,
+                      month: int) -> Optional[int]:
+        """
+        Number of days in a month, the last day of it in the index
+        :param caltype: Calendar system, 'ad' or 'bs'
+        :param year: Year
+        :param month: Month
+        :return: Days in the month or None if the month is not in the index
+        """
+        if not 1 <= month <= 12:
+            return None
+        serials = self._ad_sn if caltype == 'ad' else self._bs_sn
+        first: int = self.serial(year, month, 0)
+        # Last day before the 100th of the month
+        pos: int = bisect_right(serials, first + 99) - 1
+        if pos >= 0 and serials[pos] > first:
+            return serials[pos] - first
+        return None
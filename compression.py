@@ -0,0 +1,52 @@
+"""
+Content encoding negotiation for responses. gzip is always available,
+brotli when the brotli package is installed. Responses that are cached are
+compressed once with a high level and then served many times, others are
+compressed on the fly with a cheaper level.
+"""
+from typing import Optional
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# (level for cached responses, level for responses compressed every time)
+LEVELS: dict[str, tuple[int, int]] = {
+    'br': (9, 5),
+    'gzip': (9, 6),
+}
+
+
+def available_encodings() -> list[str]:
+    """
+    :return: Supported content encodings, most efficient first
+    """
+    if brotli is None:
+        return ['gzip']
+    return ['br', 'gzip']
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """
+    Picks the content encoding for a response
+    :param accept_encodings: Parsed Accept-Encoding header of the request
+    :return: Encoding name or None to send the body as it is
+    """
+    return accept_encodings.best_match(available_encodings())
+
+
+def compress(data: bytes, encoding: str, cached: bool = False) -> bytes:
+    """
+    :param data: Response body
+    :param encoding: 'br' or 'gzip'
+    :param cached: Whether the result is cached, which is worth a slower
+                   and better compression
+    :return: Compressed body
+    """
+    level: int = LEVELS[encoding][0 if cached else 1]
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    # No timestamp, so the same body always compresses to the same bytes
+    return gzip.compress(data, compresslevel=level, mtime=0)
@@ -0,0 +1,274 @@
+"""
+AD <-> BS date conversion by arithmetic over a table of BS month lengths.
+The table is derived from the artifacts, so any date of the BS years it
+covers can be converted and validated without the days being imported.
+AD month lengths come from the Gregorian calendar and are known for any
+year. The server corrects the table with the month lengths of the imported
+days when it loads them, so the table only has to be regenerated for years
+that are converted without being imported, with
+
+    python converter.py artifacts
+"""
+from bisect import bisect_right
+from datetime import date
+from typing import Iterable, Optional
+import calendar
+import sys
+
+from artifact_loader import ArtifactDay, find_artifacts, load_artifacts, serial
+
+# AD date of the first day of the first year in BS_MONTH_DAYS
+BS_EPOCH: date = date(2019, 4, 14)
+# BS year -> days in each of its months
+BS_MONTH_DAYS: dict[int, tuple[int, ...]] = {
+    2076: (31, 32, 31, 32, 31, 30, 30, 30, 29, 29, 30, 30),
+    2077: (31, 32, 31, 32, 31, 30, 30, 30, 29, 30, 29, 31),
+    2078: (31, 31, 31, 32, 31, 31, 30, 29, 30, 29, 30, 30),
+    2079: (31, 31, 32, 31, 31, 31, 30, 29, 30, 29, 30, 30),
+    2080: (31, 32, 31, 32, 31, 30, 30, 30, 29, 29, 30, 30),
+    2081: (31, 32, 31, 32, 31, 30, 30, 30, 29, 30, 29, 31),
+    2082: (31, 31, 32, 31, 31, 31, 30, 29, 30, 29, 30, 30),
+    2083: (31, 31, 32, 31, 31, 31, 30, 29, 30, 29, 30, 30),
+    2084: (31, 31, 32, 31, 31, 30, 30, 30, 29, 30, 30, 30),
+    2085: (31, 32, 31, 32, 30, 31, 30, 30, 29, 30, 30, 30),
+}
+
+
+class Converter:
+    """
+    Converts dates between AD and BS. Every BS year and month start is kept
+    as a proleptic Gregorian ordinal, so BS to AD is a lookup and AD to BS
+    a binary search.
+    """
+    __slots__ = ('first_year', 'last_year', '_month_days', '_month_start')
+
+    def __init__(self, month_days: dict[int, tuple[int, ...]], epoch: date):
+        """
+        :param month_days: BS year -> days in each of its 12 months, the
+                           years must follow each other without gaps
+        :param epoch: AD date of the first day of the first year
+        :raises ValueError: The table is empty, has gaps or invalid months
+        """
+        years: list[int] = sorted(month_days)
+        if not years:
+            raise ValueError('The month table is empty')
+        if years != list(range(years[0], years[-1] + 1)):
+            raise ValueError(f'The month table misses years between {years[0]} and {years[-1]}')
+        self.first_year: int = years[0]
+        self.last_year: int = years[-1]
+        self._month_days: list[tuple[int, ...]] = []
+        # Ordinal of the first day of every month, in order, plus the day
+        # after the last month
+        self._month_start: list[int] = []
+        ordinal: int = epoch.toordinal()
+        for year in years:
+            months: tuple[int, ...] = tuple(month_days[year])
+            if len(months) != 12 or not all(29 <= days <= 32 for days in months):
+                raise ValueError(f'BS year {year} has invalid month lengths {months}')
+            self._month_days.append(months)
+            for days in months:
+                self._month_start.append(ordinal)
+                ordinal += days
+        self._month_start.append(ordinal)
+
+    @classmethod
+    def from_days(cls, days: Iterable[ArtifactDay]) -> 'Converter':
+        """
+        Derives the month table from days of complete BS years
+        :param days: Days with ad_* and bs_* fields, artifacts or calendar rows
+        :raises ValueError: Years are incomplete or not contiguous
+        """
+        month_days: dict[int, list[int]] = {}
+        year_days: dict[int, int] = {}
+        epoch: Optional[date] = None
+        first_year: int = 0
+        for day in days:
+            months: list[int] = month_days.setdefault(day.bs_year, [0] * 12)
+            if day.bs_day > months[day.bs_month - 1]:
+                months[day.bs_month - 1] = day.bs_day
+            year_days[day.bs_year] = year_days.get(day.bs_year, 0) + 1
+            if (day.bs_month, day.bs_day) == (1, 1) and (
+                    epoch is None or day.bs_year < first_year):
+                epoch = date(day.ad_year, day.ad_month, day.ad_day)
+                first_year = day.bs_year
+        for year, months in month_days.items():
+            if sum(months) != year_days[year]:
+                raise ValueError(f'BS year {year} is incomplete')
+        if epoch is None or first_year != min(month_days):
+            raise ValueError('The first day of the first BS year is missing')
+        return cls({year: tuple(months) for year, months in month_days.items()}, epoch)
+
+    def corrected(self, days: Iterable) -> tuple['Converter', list[str]]:
+        """
+        Applies the month lengths of imported days to the month table. A
+        month is known from the days when its last day is followed by the
+        first day of the next month, known months replace those of the
+        table and years missing from it are added once all their months
+        are known. The table still converts the other months and years
+        :param days: Days with ad_* and bs_* fields in date order, such as
+                     the calendar index
+        :return: The corrected converter and a description of every
+                 disagreement between the table and the days
+        """
+        known: dict[tuple[int, int], int] = {}
+        # BS year -> (month, day, AD ordinal) of its first imported day
+        anchors: dict[int, tuple[int, int, int]] = {}
+        previous = None
+        previous_ordinal: int = 0
+        for day in days:
+            ordinal: int = date(day.ad_year, day.ad_month, day.ad_day).toordinal()
+            if previous is not None and day.bs_day == 1 \
+                    and ordinal == previous_ordinal + 1:
+                known[(previous.bs_year, previous.bs_month)] = previous.bs_day
+            anchors.setdefault(day.bs_year, (day.bs_month, day.bs_day, ordinal))
+            previous, previous_ordinal = day, ordinal
+        table: dict[int, list[int]] = {
+            year: list(months) for year, months in self.table().items()
+        }
+        disagreements: list[str] = []
+        for (year, month), days_in_month in sorted(known.items()):
+            if year in table and table[year][month - 1] != days_in_month:
+                disagreements.append(
+                    f'BS {year}-{month} has {days_in_month} days in the '
+                    f'imported days, not {table[year][month - 1]} as in the month table'
+                )
+                table[year][month - 1] = days_in_month
+        for year in sorted({year for year, _ in known} - set(table)):
+            if all((year, month) in known for month in range(1, 13)):
+                table[year] = [known[(year, month)] for month in range(1, 13)]
+        # The years have to follow each other, keep those around the first
+        # imported day that the table covers
+        anchor_year: Optional[int] = next(
+            (year for year in sorted(anchors) if year in table), None
+        )
+        if anchor_year is None:
+            return self, disagreements
+        month, day, ordinal = anchors[anchor_year]
+        imported: date = date.fromordinal(ordinal)
+        expected: Optional[tuple[int, int, int]] = self.bs_to_ad(anchor_year, month, day)
+        if expected is not None and expected != (imported.year, imported.month, imported.day):
+            disagreements.append(
+                f'BS {anchor_year}-{month}-{day} is AD {imported} in the '
+                f'imported days, not AD {date(*expected)} as in the month table'
+            )
+        first: int = anchor_year
+        last: int = anchor_year
+        while first - 1 in table:
+            first -= 1
+        while last + 1 in table:
+            last += 1
+        offset: int = sum(sum(table[year]) for year in range(first, anchor_year)) \
+            + sum(table[anchor_year][:month - 1]) + day - 1
+        try:
+            return Converter(
+                {year: tuple(table[year]) for year in range(first, last + 1)},
+                date.fromordinal(ordinal - offset)
+            ), disagreements
+        except ValueError as e:
+            return self, disagreements + [f'Cannot correct the month table: {e}']
+
+    def table(self) -> dict[int, tuple[int, ...]]:
+        """
+        :return: BS year -> days in each of its months
+        """
+        return {
+            self.first_year + pos: months
+            for pos, months in enumerate(self._month_days)
+        }
+
+    def epoch(self) -> date:
+        return date.fromordinal(self._month_start[0])
+
+    def days_in_month(self, caltype: str, year: int,
+                      month: int) -> Optional[int]:
+        """
+        :param caltype: Calendar system, 'ad' or 'bs'
+        :param year: Year
+        :param month: Month
+        :return: Days in the month or None if the month is not known
+        """
+        if not 1 <= month <= 12:
+            return None
+        if caltype == 'ad':
+            return calendar.monthrange(year, month)[1] \
+                if 1 <= year <= 9999 else None
+        if not self.first_year <= year <= self.last_year:
+            return None
+        return self._month_days[year - self.first_year][month - 1]
+
+    def is_valid(self, caltype: str, year: int, month: int, day: int) -> bool:
+        return 1 <= day <= (self.days_in_month(caltype, year, month) or 0)
+
+    def bs_to_ad(self, year: int, month: int,
+                 day: int) -> Optional[tuple[int, int, int]]:
+        """
+        :return: AD (year, month, day) or None if the BS date is invalid or
+                 outside the table
+        """
+        if not self.is_valid('bs', year, month, day):
+            return None
+        converted: date = date.fromordinal(
+            self._month_start[(year - self.first_year) * 12 + month - 1] + day - 1
+        )
+        return converted.year, converted.month, converted.day
+
+    def ad_to_bs(self, year: int, month: int,
+                 day: int) -> Optional[tuple[int, int, int]]:
+        """
+        :return: BS (year, month, day) or None if the AD date is invalid or
+                 outside the table
+        """
+        if not self.is_valid('ad', year, month, day):
+            return None
+        ordinal: int = date(year, month, day).toordinal()
+        if not self._month_start[0] <= ordinal < self._month_start[-1]:
+            return None
+        pos: int = bisect_right(self._month_start, ordinal) - 1
+        return (
+            self.first_year + pos // 12, pos % 12 + 1,
+            ordinal - self._month_start[pos] + 1
+        )
+
+    def convert(self, caltype: str, year: int, month: int,
+                day: int) -> Optional[tuple[int, int, int]]:
+        """
+        Converts a date to the other calendar system, like
+        CalendarIndex.convert() but for days that are not imported too
+        :param caltype: Calendar system of the given date, 'ad' or 'bs'
+        :return: (year, month, day) in the other calendar or None
+        """
+        if caltype == 'ad':
+            return self.ad_to_bs(year, month, day)
+        return self.bs_to_ad(year, month, day)
+
+    def serials(self, caltype: str, year: int, month: int,
+                day: int) -> Optional[tuple[int, int]]:
+        """
+        :param caltype: Calendar system of the given date, 'ad' or 'bs'
+        :return: (ad_sn, bs_sn) of the date as stored in the calendar table
+        """
+        converted: Optional[tuple[int, int, int]] = self.convert(caltype, year, month, day)
+        if converted is None:
+            return None
+        if caltype == 'ad':
+            return serial(year, month, day), serial(*converted)
+        return serial(*converted), serial(year, month, day)
+
+
+converter: Converter = Converter(BS_MONTH_DAYS, BS_EPOCH)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print(f'Usage: python {sys.argv[0]} <artifact directory>')
+        sys.exit(1)
+    derived: Converter = Converter.from_days(
+        day for artifact in load_artifacts(sorted(find_artifacts(sys.argv[1]).values()))
+        for day in artifact.days
+    )
+    epoch: date = derived.epoch()
+    print(f'BS_EPOCH: date = date({epoch.year}, {epoch.month}, {epoch.day})')
+    print('BS_MONTH_DAYS: dict[int, tuple[int, ...]] = {')
+    for bs_year, month_lengths in derived.table().items():
+        print(f'    {bs_year}: {month_lengths},')
+    print('}')
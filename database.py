@@ -0,0 +1,180 @@
+"""
+Database engine configuration. The primary database, its connection pool
+and a per statement timeout are configured from the environment, read only
+handlers can be routed to replicas of it. Replicas are picked round robin
+per request, any database holding a copy of the primary works, including
+plain copies of the SQLite file.
+"""
+from typing import Optional
+import itertools
+import time
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Engine, Table, event, insert, make_url
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# SQLite virtual machine instructions between two statement timeout checks
+SQLITE_PROGRESS_STEPS: int = 10000
+
+
+def is_memory_sqlite(uri: str) -> bool:
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(uri: str, pool_size: int = 0, pool_recycle: int = -1,
+                   statement_timeout: float = 0) -> dict:
+    """
+    Builds the SQLAlchemy engine options of a database
+    :param uri: Database URI
+    :param pool_size: Connections kept open per process, 0 for the driver default
+    :param pool_recycle: Seconds after which connections are reopened, -1 never
+    :param statement_timeout: Seconds a statement may run, 0 for no limit
+    :return: Keyword arguments for create_engine()
+    """
+    backend: str = make_url(uri).get_backend_name()
+    options: dict = {}
+    if pool_size > 0 and not is_memory_sqlite(uri):
+        options['pool_size'] = pool_size
+    if pool_recycle >= 0:
+        options['pool_recycle'] = pool_recycle
+    if backend != 'sqlite':
+        # Replicas behind a load balancer drop idle connections
+        options['pool_pre_ping'] = True
+    if statement_timeout > 0:
+        if backend == 'sqlite':
+            # Waiting for a lock held by a writer counts too
+            options['connect_args'] = {'timeout': statement_timeout}
+        elif backend == 'postgresql':
+            options['connect_args'] = {
+                'options': f'-c statement_timeout={int(statement_timeout * 1000)}'
+            }
+    return options
+
+
+def set_statement_timeout(engine: Engine, seconds: float) -> None:
+    """
+    Aborts statements of the engine running longer than the timeout, for
+    databases that cannot be configured through engine_options()
+    :param engine: Engine to limit
+    :param seconds: Seconds a statement may run, 0 for no limit
+    :return:
+    """
+    if seconds <= 0:
+        return None
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def install_progress_handler(dbapi_connection, connection_record):
+            deadline: list[float] = [float('inf')]
+            connection_record.info['statement_deadline'] = deadline
+            dbapi_connection.set_progress_handler(
+                lambda: time.monotonic() > deadline[0], SQLITE_PROGRESS_STEPS
+            )
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_deadline(connection, cursor, statement, parameters, context, executemany):
+            connection.info['statement_deadline'][0] = time.monotonic() + seconds
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def stop_deadline(connection, cursor, statement, parameters, context, executemany):
+            # Streamed results are fetched at the pace of the client, only
+            # the time until the first row is limited for them
+            if context is not None and context.execution_options.get('yield_per'):
+                connection.info['statement_deadline'][0] = float('inf')
+
+        @event.listens_for(engine, 'checkin')
+        def clear_deadline(dbapi_connection, connection_record):
+            if 'statement_deadline' in connection_record.info:
+                connection_record.info['statement_deadline'][0] = float('inf')
+    elif engine.dialect.name in ('mysql', 'mariadb'):
+        variable: str = 'max_statement_time' if engine.dialect.is_mariadb \
+            else 'max_execution_time'
+        value: float = seconds if engine.dialect.is_mariadb else int(seconds * 1000)
+
+        @event.listens_for(engine, 'connect')
+        def set_session_timeout(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f'SET SESSION {variable} = {value}')
+            cursor.close()
+    elif engine.dialect.name != 'postgresql':
+        print(f'[W] Statement timeouts are not supported on {engine.dialect.name}, ignoring it')
+    return None
+
+
+def set_query_only(engine: Engine) -> None:
+    """
+    Makes every connection of a SQLite engine opened from now on read only
+    :param engine: Engine to restrict, other databases are left untouched
+    :return:
+    """
+    if engine.dialect.name == 'sqlite':
+        event.listen(
+            engine, 'connect',
+            lambda dbapi_connection, _: dbapi_connection.execute(
+                'PRAGMA query_only = ON'
+            )
+        )
+
+
+def insert_ignore(table: Table, dialect: str):
+    """
+    :param table: Table to insert into
+    :param dialect: Name of the database dialect
+    :return: INSERT statement skipping rows that violate a unique constraint
+    """
+    if dialect == 'sqlite':
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql_insert(table).on_conflict_do_nothing()
+    if dialect in ('mysql', 'mariadb'):
+        return insert(table).prefix_with('IGNORE')
+    raise ValueError(f'Importing artifacts is not supported on {dialect}')
+
+
+class ReadReplicas:
+    """
+    Round robin over the engines of the read replicas
+    """
+
+    def __init__(self):
+        self.engines: list[Engine] = []
+        self._cycle = iter(())
+
+    def set(self, engines: list[Engine]) -> None:
+        """
+        :param engines: Engines of the usable replicas, empty to read from
+                        the primary database
+        :return:
+        """
+        self.engines = list(engines)
+        self._cycle = itertools.cycle(self.engines)
+
+    def next(self) -> Optional[Engine]:
+        """
+        :return: Engine of the next replica or None without replicas
+        """
+        return next(self._cycle, None)
+
+
+def read_engine() -> Optional[Engine]:
+    """
+    :return: Replica picked for the current request, None outside read only
+             handlers
+    """
+    return g.get('read_engine') if has_app_context() else None
+
+
+class RoutingSession(Session):
+    """
+    Session sending the statements of read only handlers to the replica
+    picked for the request, and everything else to the primary database
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing:
+            replica: Optional[Engine] = read_engine()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
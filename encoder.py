@@ -0,0 +1,158 @@
+"""
+Pluggable JSON encoding for API responses. orjson is used when it is
+installed and the standard library otherwise, both producing compact
+output with sorted keys. Other encoders can be added with register().
+MessagePack is available as a binary alternative when msgpack is installed.
+"""
+from typing import Any, Callable
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ENCODERS: dict[str, Callable[[Any], bytes]] = {}
+
+
+def register(name: str, dumps: Callable[[Any], bytes]) -> None:
+    """
+    Makes an encoder selectable with JSON_ENCODER=<name>
+    :param name: Encoder name
+    :param dumps: Function serializing an object to compact UTF-8 JSON with
+                  sorted keys
+    :return:
+    """
+    ENCODERS[name] = dumps
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(
+        obj, sort_keys=True, separators=(',', ':'),
+        default=DefaultJSONProvider.default
+    ).encode()
+
+
+register('json', _json_dumps)
+if orjson is not None:
+    register('orjson', lambda obj: orjson.dumps(
+        obj, option=orjson.OPT_SORT_KEYS,
+        default=DefaultJSONProvider.default
+    ))
+
+
+def get_encoder(name: str = 'auto') -> tuple[str, Callable[[Any], bytes]]:
+    """
+    Picks an encoder, 'auto' prefers orjson when it is installed
+    :param name: Encoder name or 'auto'
+    :return: Name and dumps function of the encoder
+    """
+    if name == 'auto':
+        name = 'orjson' if 'orjson' in ENCODERS else 'json'
+    if name not in ENCODERS:
+        raise ValueError(
+            f'Unknown JSON encoder "{name}", available: {", ".join(ENCODERS)}'
+        )
+    return name, ENCODERS[name]
+
+
+def _append_object(obj: dict, parts: list[bytes]) -> None:
+    parts.append(b'{')
+    for pos, key in enumerate(sorted(obj)):
+        parts.append(b'"%s":' % key.encode() if pos == 0
+                     else b',"%s":' % key.encode())
+        value = obj[key]
+        if isinstance(value, dict):
+            _append_object(value, parts)
+        else:
+            parts.append(value)
+    parts.append(b'}')
+
+
+def join_object(obj: dict) -> bytes:
+    """
+    Encodes nested dicts whose leaves are already encoded JSON, so cached
+    fragments are written into a response without decoding and encoding
+    them again, and are copied only once
+    :param obj: Dict of str keys not needing escaping to encoded values or
+                further such dicts
+    :return: Encoded object with keys sorted like the encoders sort them
+    """
+    parts: list[bytes] = []
+    _append_object(obj, parts)
+    return b''.join(parts)
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def pack(obj: Any) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def _map_header(size: int) -> bytes:
+    if size < 16:
+        return bytes((0x80 | size,))
+    if size < 0x10000:
+        return b'\xde' + size.to_bytes(2, 'big')
+    return b'\xdf' + size.to_bytes(4, 'big')
+
+
+def _append_map(obj: dict, parts: list[bytes]) -> None:
+    parts.append(_map_header(len(obj)))
+    for key in sorted(obj):
+        encoded_key: bytes = key.encode()
+        # Keys are short, skip a packb() call for them
+        parts.append(
+            bytes((0xa0 | len(encoded_key),)) + encoded_key
+            if len(encoded_key) < 32 else pack(key)
+        )
+        value = obj[key]
+        if isinstance(value, dict):
+            _append_map(value, parts)
+        else:
+            parts.append(value)
+
+
+def join_map(obj: dict) -> bytes:
+    """
+    MessagePack counterpart of join_object()
+    :param obj: Dict of str keys to packed values or further such dicts
+    :return: Packed map with sorted keys
+    """
+    parts: list[bytes] = []
+    _append_map(obj, parts)
+    return b''.join(parts)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that serializes with the selected encoder
+    """
+
+    def __init__(self, app, encoder: str = 'auto'):
+        """
+        :param app: Flask application
+        :param encoder: Encoder name or 'auto'
+        """
+        super().__init__(app)
+        self.encoder, self.encode = get_encoder(encoder)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode()
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj: Any = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            self.encode(obj) + b'\n', mimetype=self.mimetype
+        )
@@ -0,0 +1,331 @@
+"""
+Streaming holiday export. Days from artifacts, snapshots or the API are
+turned into calendar entries by one generator pipeline, which the kholiday,
+iCalendar and CSV emitters write out line by line, so exports of any number
+of years are written with constant memory.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Iterable, Iterator, NamedTuple, Sequence
+import csv
+import io
+
+from artifact_loader import ArtifactDay
+
+EVENT_TYPES: tuple[str, ...] = (
+    'holidays', 'non_holiday_events', 'nepali_date', 'tithi', 'panchangam'
+)
+# Event type -> section of kholiday files and category of other formats
+SECTIONS: dict[str, str] = {
+    'holidays': 'Public Holidays',
+    'non_holiday_events': 'Civil',
+    'nepali_date': 'Bikram Sambat Dates',
+    'tithi': 'Nepali Tithis',
+    'panchangam': 'Panchangam',
+}
+MONTHS: tuple[str, ...] = (
+    'january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december'
+)
+NEP_MONTHS: tuple[str, ...] = (
+    'बैशाख', 'जेष्ठ', 'आषाढ़', 'श्रावण', 'भाद्र', 'आश्विन',
+    'कार्तिक', 'मंसिर', 'पौष', 'माघ', 'फाल्गुन', 'चैत्र'
+)
+NEP_DIGITS: dict[int, str] = str.maketrans('0123456789', '०१२३४५६७८९')
+
+KHOLIDAY_HEADER: str = '''
+::
+:: Country:  Nepal
+::
+:: Language: Nepali
+::
+:: Author:   CausalSnek <contact@casualsnek.eu.org>
+::
+:: Updated:  {updated}
+::
+:: Source:   https://api.casualsnek.eu.org/nepcalev/2080
+::           https://github.com/casualsnek/nepcalev
+:: Metadata
+country     "NP"
+language    "np"
+name        "National events for Nepal"
+description "National events file for Nepal includes {event_types}"
+'''.strip()
+# Event type -> kholiday line, the tithi line keeps the space of the old files
+KHOLIDAY_LINES: dict[str, str] = {
+    'holidays': '\n"{name}" public on {date}',
+    'non_holiday_events': '\n"{name}" civil on {date}',
+    'nepali_date': '\n"{name}" nameday on {date}',
+    'tithi': '\n"{name} " nameday on {date}',
+    'panchangam': '\n"{name}" nameday on {date}',
+}
+MEDIA_TYPES: dict[str, str] = {
+    'kholiday': 'text/plain; charset=utf-8',
+    'ics': 'text/calendar; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+EXTENSIONS: dict[str, str] = {'kholiday': '', 'ics': '.ics', 'csv': '.csv'}
+
+
+class ExportOptions(NamedTuple):
+    event_types: tuple[str, ...] = EVENT_TYPES
+    # Prefix the names of public holidays with "सार्बजनिक बिदा: "
+    append_bida: bool = False
+    # Prefix the names of panchangam events with "पञ्चाङ्ग:"
+    append_panchangam: bool = False
+    # One entry with all the holidays of a day instead of one per holiday
+    flatten_holidays: bool = False
+
+
+class Entry(NamedTuple):
+    event_type: str
+    day: ArtifactDay
+    name: str
+
+
+class Reiterable:
+    """
+    Days that are read again from their source on every walk, so emitters
+    walking them more than once do not need them all in memory
+    """
+    __slots__ = ('walk',)
+
+    def __init__(self, walk: Callable[[], Iterator[ArtifactDay]]):
+        """
+        :param walk: Returns a new iterator over the days, in date order
+        """
+        self.walk: Callable[[], Iterator[ArtifactDay]] = walk
+
+    def __iter__(self) -> Iterator[ArtifactDay]:
+        return self.walk()
+
+
+def parse_event_types(value: str) -> tuple[str, ...]:
+    """
+    :param value: Comma separated event types
+    :return: Event types
+    :raises ValueError: An event type is unknown
+    """
+    event_types: tuple[str, ...] = tuple(
+        item.strip() for item in value.split(',') if item.strip() != ''
+    )
+    unknown: list[str] = [item for item in event_types if item not in SECTIONS]
+    if unknown:
+        raise ValueError(
+            f'Unknown event type "{unknown[0]}", available: {",".join(EVENT_TYPES)}'
+        )
+    return event_types
+
+
+def nep_date_to_str(year: int, month: int, day: int) -> str:
+    """
+    :return: BS date written in Nepali, such as "बैशाख १, २०८०"
+    """
+    return f'{NEP_MONTHS[month - 1]} {str(day).translate(NEP_DIGITS)}, ' \
+           f'{str(year).translate(NEP_DIGITS)}'
+
+
+def day_entries(day: ArtifactDay, event_type: str,
+                options: ExportOptions) -> Iterator[Entry]:
+    """
+    :param day: Day to export
+    :param event_type: One of EVENT_TYPES
+    :param options: Export options
+    :return: Entries of one event type on a day
+    """
+    if event_type == 'holidays':
+        if not day.is_holiday:
+            return None
+        prefix: str = 'सार्बजनिक बिदा: ' if options.append_bida else ''
+        if options.flatten_holidays:
+            yield Entry(event_type, day, prefix + '/'.join(day.events))
+        else:
+            for event in day.events:
+                yield Entry(event_type, day, prefix + event)
+    elif event_type == 'non_holiday_events':
+        if not day.is_holiday:
+            for event in day.events:
+                yield Entry(event_type, day, event)
+    elif event_type == 'nepali_date':
+        yield Entry(
+            event_type, day, nep_date_to_str(day.bs_year, day.bs_month, day.bs_day)
+        )
+    elif event_type == 'tithi':
+        yield Entry(event_type, day, day.tithi)
+    elif event_type == 'panchangam':
+        prefix = 'पञ्चाङ्ग:' if options.append_panchangam else ''
+        for event in day.panchangam:
+            yield Entry(event_type, day, prefix + event)
+
+
+def iter_entries(days: Iterable[ArtifactDay],
+                 options: ExportOptions) -> Iterator[Entry]:
+    """
+    :param days: Days to export, in date order
+    :param options: Export options
+    :return: Entries day by day, in EVENT_TYPES order within a day
+    """
+    event_types: list[str] = [
+        event_type for event_type in EVENT_TYPES
+        if event_type in options.event_types
+    ]
+    for day in days:
+        for event_type in event_types:
+            yield from day_entries(day, event_type, options)
+
+
+def emit_kholiday(days: Sequence[ArtifactDay], options: ExportOptions,
+                  updated: date = None) -> Iterator[str]:
+    """
+    Writes a KDE kholiday holiday file. Entries are grouped by section, so
+    the days are walked once per selected event type
+    :param days: Days to export, in date order, iterable more than once
+                 such as a list or a Reiterable
+    :param options: Export options
+    :param updated: Date written into the header, today when not given
+    :return: Chunks of the file
+    """
+    updated = updated or date.today()
+    yield KHOLIDAY_HEADER.format(
+        updated=f'{updated.year}-{updated.month}-{updated.day}',
+        event_types=','.join(options.event_types)
+    )
+    for event_type in EVENT_TYPES:
+        yield f'\n\n:: {SECTIONS[event_type]}'
+        if event_type not in options.event_types:
+            continue
+        line: str = KHOLIDAY_LINES[event_type]
+        for day in days:
+            on: str = f'{MONTHS[day.ad_month - 1]} {day.ad_day} {day.ad_year}'
+            for entry in day_entries(day, event_type, options):
+                yield line.format(name=entry.name, date=on)
+
+
+def ics_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace(';', '\\;') \
+        .replace(',', '\\,').replace('\n', '\\n')
+
+
+def ics_fold(line: str) -> str:
+    """
+    Folds a content line into lines of at most 75 octets as RFC 5545 asks
+    """
+    encoded: bytes = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts: list[str] = []
+    start: int = 0
+    limit: int = 75
+    while start < len(encoded):
+        end: int = min(start + limit, len(encoded))
+        # Never split a UTF-8 sequence
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start = end
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def emit_ics(days: Iterable[ArtifactDay], options: ExportOptions,
+             stamp: datetime = None) -> Iterator[str]:
+    """
+    Writes an iCalendar file with one all day event per entry
+    :param days: Days to export, in date order
+    :param options: Export options
+    :param stamp: DTSTAMP of the events, now when not given
+    :return: Chunks of the file
+    """
+    dtstamp: str = (stamp or datetime.now(timezone.utc)).strftime('%Y%m%dT%H%M%SZ')
+    yield 'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n' \
+          'PRODID:-//casualsnek//npEventsAPI//NE\r\n' \
+          'CALSCALE:GREGORIAN\r\nX-WR-CALNAME:National events for Nepal\r\n'
+    # Entries of a day are numbered per event type for stable UIDs
+    numbers: dict[str, int] = {}
+    current: int = 0
+    for entry in iter_entries(days, options):
+        if entry.name == '':
+            continue
+        day: ArtifactDay = entry.day
+        if day.ad_sn != current:
+            numbers, current = {}, day.ad_sn
+        numbers[entry.event_type] = number = numbers.get(entry.event_type, 0) + 1
+        start: date = date(day.ad_year, day.ad_month, day.ad_day)
+        yield (
+            'BEGIN:VEVENT\r\n'
+            f'UID:{day.ad_sn}-{entry.event_type}-{number}@npeventsapi\r\n'
+            f'DTSTAMP:{dtstamp}\r\n'
+            f'DTSTART;VALUE=DATE:{start:%Y%m%d}\r\n'
+            f'DTEND;VALUE=DATE:{start + timedelta(days=1):%Y%m%d}\r\n'
+            + ics_fold(f'SUMMARY:{ics_escape(entry.name)}')
+            + ics_fold(f'CATEGORIES:{ics_escape(SECTIONS[entry.event_type])}')
+            + f'TRANSP:{"OPAQUE" if entry.event_type == "holidays" else "TRANSPARENT"}\r\n'
+            'END:VEVENT\r\n'
+        )
+    yield 'END:VCALENDAR\r\n'
+
+
+def emit_csv(days: Iterable[ArtifactDay],
+             options: ExportOptions) -> Iterator[str]:
+    """
+    Writes one CSV row per entry
+    :param days: Days to export, in date order
+    :param options: Export options
+    :return: Chunks of the file
+    """
+    buffer: io.StringIO = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('ad_date', 'bs_date', 'type', 'name', 'public_holiday'))
+    for entry in iter_entries(days, options):
+        if entry.name == '':
+            continue
+        day: ArtifactDay = entry.day
+        writer.writerow((
+            f'{day.ad_year}-{day.ad_month:02d}-{day.ad_day:02d}',
+            f'{day.bs_year}-{day.bs_month:02d}-{day.bs_day:02d}',
+            entry.event_type, entry.name, int(day.is_holiday)
+        ))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def emit(export_format: str, days: Sequence[ArtifactDay],
+         options: ExportOptions, updated: datetime = None) -> Iterator[str]:
+    """
+    :param export_format: 'kholiday', 'ics' or 'csv'
+    :param days: Days to export, in date order. kholiday files walk them
+                 once per event type, see emit_kholiday()
+    :param options: Export options
+    :param updated: When the data was last changed, now when not given
+    :return: Chunks of the file
+    """
+    if export_format == 'kholiday':
+        return emit_kholiday(days, options, updated=updated and updated.date())
+    if export_format == 'ics':
+        return emit_ics(days, options, stamp=updated)
+    if export_format == 'csv':
+        return emit_csv(days, options)
+    raise ValueError(
+        f'Unsupported export format \'{export_format}\' ! Use one of: '
+        f'{", ".join(MEDIA_TYPES)}'
+    )
+
+
+def buffered(chunks: Iterable[str], size: int = 16384) -> Iterator[bytes]:
+    """
+    Joins small chunks into blocks of about size bytes for writing
+    :param chunks: Text chunks
+    :param size: Block size in bytes
+    :return: UTF-8 encoded blocks
+    """
+    parts: list[str] = []
+    length: int = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(parts).encode()
+            parts, length = [], 0
+    if parts:
+        yield ''.join(parts).encode()
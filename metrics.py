@@ -0,0 +1,288 @@
+"""
+Counters and histograms rendered in the Prometheus text format, plus the
+per request bookkeeping behind the stage timings and the Server-Timing
+header. Recording a value takes a lock and a few additions, so metrics can
+stay enabled in production. Every process keeps its own values.
+"""
+from bisect import bisect_left
+from threading import Lock
+from typing import Callable, Iterable, Optional
+import functools
+import time
+
+from flask import g, has_request_context
+from sqlalchemy import Engine, event
+
+# Upper bounds of the time histograms, in seconds
+TIME_BUCKETS: tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5
+)
+STATEMENT_BUCKETS: tuple[float, ...] = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+CONTENT_TYPE: str = 'text/plain; version=0.0.4; charset=utf-8'
+# Stages are only recorded when enabled, see set_enabled()
+enabled: bool = True
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = '') -> str:
+    pairs: list[str] = [
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """
+    Monotonic total, one per combination of label values
+    """
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name: str = name
+        self.description: str = description
+        self.labels: tuple[str, ...] = labels
+        # Totals without labels exist from the start
+        self._values: dict[tuple, float] = {} if labels else {(): 0}
+        self._lock: Lock = Lock()
+
+    def inc(self, *labels, value: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values: list[tuple[tuple, float]] = sorted(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{_labels(self.labels, labels)} {_number(value)}'
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets, one per combination
+    of label values
+    """
+
+    def __init__(self, name: str, description: str,
+                 buckets: tuple[float, ...] = TIME_BUCKETS,
+                 labels: tuple[str, ...] = ()):
+        self.name: str = name
+        self.description: str = description
+        self.buckets: tuple[float, ...] = buckets
+        self.labels: tuple[str, ...] = labels
+        # Label values -> [count per bucket and +Inf, sum]
+        self._values: dict[tuple, list] = {}
+        self._lock: Lock = Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        pos: int = bisect_left(self.buckets, value)
+        with self._lock:
+            entry: Optional[list] = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][pos] += 1
+            entry[1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            values: list[tuple[tuple, list]] = sorted(
+                (labels, (list(counts), total))
+                for labels, (counts, total) in self._values.items()
+            )
+        for labels, (counts, total) in values:
+            cumulative: int = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le: str = 'le="+Inf"' if bound == float('inf') else f'le="{_number(bound)}"'
+                yield f'{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {cumulative}'
+
+
+class Gauge:
+    """
+    Values read from a callback when the metrics are rendered, such as
+    the sizes and counters kept by other objects
+    """
+
+    def __init__(self, name: str, description: str,
+                 read: Callable[[], Iterable[tuple[tuple, float]]],
+                 labels: tuple[str, ...] = (), kind: str = 'gauge'):
+        """
+        :param read: Returns (label values, value) pairs
+        :param kind: Prometheus type, 'counter' for totals kept elsewhere
+        """
+        self.name: str = name
+        self.description: str = description
+        self.labels: tuple[str, ...] = labels
+        self.read: Callable[[], Iterable[tuple[tuple, float]]] = read
+        self.kind: str = kind
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} {self.kind}'
+        for labels, value in self.read():
+            yield f'{self.name}{_labels(self.labels, labels)} {_number(value)}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(
+            line for metric in self.metrics for line in metric.render()
+        ) + '\n'
+
+
+registry: Registry = Registry()
+request_seconds: Histogram = registry.add(Histogram(
+    'npeventsapi_request_duration_seconds',
+    'Time until the response of a request is ready, streamed bodies excluded',
+    labels=('endpoint',)
+))
+requests_total: Counter = registry.add(Counter(
+    'npeventsapi_requests_total', 'Requests answered', labels=('endpoint', 'status')
+))
+stage_seconds: Histogram = registry.add(Histogram(
+    'npeventsapi_stage_duration_seconds',
+    'Time spent in a stage of serving, sql overlaps the stages running statements',
+    labels=('stage',)
+))
+request_statements: Histogram = registry.add(Histogram(
+    'npeventsapi_request_sql_statements', 'SQL statements run per request',
+    buckets=STATEMENT_BUCKETS, labels=('endpoint',)
+))
+statements_total: Counter = registry.add(Counter(
+    'npeventsapi_sql_statements_total', 'SQL statements run'
+))
+import_rows: Counter = registry.add(Counter(
+    'npeventsapi_import_rows_total', 'Rows written by artifact imports'
+))
+import_seconds: Counter = registry.add(Counter(
+    'npeventsapi_import_seconds_total', 'Time spent importing artifacts'
+))
+
+
+class Stage:
+    """
+    Times a block as a stage of the current request, usable as context
+    manager or as decorator
+    """
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name: str):
+        self.name: str = name
+
+    def __enter__(self):
+        self.started: float = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.name, time.perf_counter() - self.started)
+
+    def __call__(self, func):
+        name: str = self.name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started: float = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_stage(name, time.perf_counter() - started)
+        return wrapper
+
+
+def set_enabled(value: bool) -> None:
+    global enabled
+    enabled = value
+
+
+def record_stage(name: str, seconds: float) -> None:
+    if not enabled:
+        return None
+    stage_seconds.observe(seconds, name)
+    if has_request_context():
+        timings: Optional[dict] = g.get('stage_timings')
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+
+def start_request() -> None:
+    g.request_started = time.perf_counter()
+    g.stage_timings = {}
+    g.sql_statements = 0
+
+
+def finish_request(endpoint: str, status: int) -> Optional[dict[str, float]]:
+    """
+    Records the metrics of the current request
+    :param endpoint: Name of the view, or a placeholder for unknown routes
+    :param status: Status code of the response
+    :return: Seconds per stage and in total, None if the request was not
+             started through start_request()
+    """
+    started: Optional[float] = g.get('request_started')
+    if started is None:
+        return None
+    timings: dict[str, float] = g.stage_timings
+    timings['total'] = time.perf_counter() - started
+    request_seconds.observe(timings['total'], endpoint)
+    requests_total.inc(endpoint, status)
+    request_statements.observe(g.sql_statements, endpoint)
+    return timings
+
+
+def server_timing(timings: dict[str, float]) -> str:
+    """
+    :param timings: Seconds per stage, as returned by finish_request()
+    :return: Value of a Server-Timing header, the sql entry also tells the
+             number of statements
+    """
+    return ', '.join(
+        f'{name};dur={seconds * 1000:.2f}'
+        + (f';desc="{g.sql_statements} statement{"s" if g.sql_statements != 1 else ""}"'
+           if name == 'sql' else '')
+        for name, seconds in timings.items()
+    )
+
+
+def record_import(rows: int, seconds: float) -> None:
+    import_rows.inc(value=rows)
+    import_seconds.inc(value=seconds)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Counts and times the statements run by an engine
+    :param engine: Engine to instrument
+    :return:
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def statement_started(connection, cursor, statement, parameters, context, executemany):
+        connection.info['statement_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def statement_finished(connection, cursor, statement, parameters, context, executemany):
+        statements_total.inc()
+        record_stage('sql', time.perf_counter() - connection.info.pop(
+            'statement_started', time.perf_counter()
+        ))
+        if has_request_context() and 'sql_statements' in g:
+            g.sql_statements += 1
@@ -0,0 +1,102 @@
+"""
+Versioned schema migrations. db.create_all() only creates missing tables,
+so changes to existing tables are applied here, in order, exactly once per
+database. SQLite keeps the schema version in PRAGMA user_version, other
+databases in a one row schema_version table.
+"""
+from typing import Callable
+import time
+
+from sqlalchemy import Connection, MetaData, text
+
+
+def add_query_indexes(connection: Connection, metadata: MetaData) -> None:
+    """
+    Removes duplicated event relations, then adds the indexes declared on
+    the models: a unique one on relations, and the ones used by the date
+    lookups, the relation joins and the event lookups of the importer
+    """
+    connection.execute(text(
+        'DELETE FROM calendar_event_relationship WHERE id NOT IN ('
+        'SELECT id FROM (SELECT MIN(id) AS id FROM calendar_event_relationship '
+        'GROUP BY day_id, event_id) AS keep)'
+    ))
+    for table in ('calendar', 'events', 'calendar_event_relationship'):
+        for index in metadata.tables[table].indexes:
+            index.create(connection, checkfirst=True)
+
+
+# Appending a migration bumps the schema version, never reorder or remove
+MIGRATIONS: list[tuple[str, Callable[[Connection, MetaData], None]]] = [
+    ('Add indexes for the hot query columns', add_query_indexes),
+]
+SCHEMA_VERSION: int = len(MIGRATIONS)
+
+
+def get_schema_version(connection: Connection) -> int:
+    if connection.dialect.name == 'sqlite':
+        return connection.execute(text('PRAGMA user_version')).scalar()
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'
+    ))
+    version = connection.execute(
+        text('SELECT MAX(version) FROM schema_version')
+    ).scalar()
+    return version or 0
+
+
+def set_schema_version(connection: Connection, version: int) -> None:
+    if connection.dialect.name == 'sqlite':
+        # PRAGMA does not take bound parameters
+        connection.execute(text(f'PRAGMA user_version = {int(version)}'))
+        return None
+    connection.execute(text('DELETE FROM schema_version'))
+    connection.execute(
+        text('INSERT INTO schema_version (version) VALUES (:version)'),
+        {'version': version}
+    )
+    return None
+
+
+def migrate(connection: Connection, metadata: MetaData) -> int:
+    """
+    Applies every migration the database has not seen yet, each one in its
+    own transaction together with the version bump
+    :param connection: Connection to the database, outside a transaction
+    :param metadata: Metadata of the models
+    :return: Number of applied migrations
+    """
+    applied: int = 0
+    with connection.begin():
+        version: int = get_schema_version(connection)
+    if version > SCHEMA_VERSION:
+        print(
+            f'[W] Database schema version {version} is newer than this '
+            f'server ({SCHEMA_VERSION}), skipping migrations'
+        )
+        return 0
+    for number, (description, migration) in enumerate(
+            MIGRATIONS[version:], start=version + 1):
+        started: float = time.perf_counter()
+        with connection.begin():
+            migration(connection, metadata)
+            set_schema_version(connection, number)
+        applied += 1
+        print(
+            f'[I] Applied schema migration {number}: {description} '
+            f'({time.perf_counter() - started:.2f}s)'
+        )
+    return applied
+
+
+def analyze(connection: Connection) -> None:
+    """
+    Refreshes the planner statistics, run after migrations or imports
+    changed the tables so the planner picks the indexes. Statistics of
+    empty tables make it scan instead
+    :param connection: Connection to the database, outside a transaction
+    :return:
+    """
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        with connection.begin():
+            connection.execute(text('ANALYZE'))
@@ -0,0 +1,153 @@
+"""
+In-process full text index over event names. Names are normalized so that
+common Devanagari spelling variants (nukta, chandrabindu, zero width
+joiners) and letter case do not matter, and query words match by prefix.
+"""
+from bisect import bisect_left
+from typing import NamedTuple
+import unicodedata
+import functools
+import re
+
+from snapshot import Snapshot
+
+TOKEN_SPLIT: re.Pattern = re.compile(r'[^\w\u0900-\u097F]+')
+VARIANTS: dict[int, str] = {
+    0x093C: '',  # Nukta, ड़ and ड are searched alike
+    0x0901: '\u0902',  # Chandrabindu is searched as anusvara
+    0x200C: '',  # Zero width non-joiner
+    0x200D: '',  # Zero width joiner
+}
+
+
+class SearchResult(NamedTuple):
+    event_name: str
+    event_class: str
+    days: list[int]
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize('NFC', text).translate(VARIANTS).casefold()
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in TOKEN_SPLIT.split(normalize(text)) if token]
+
+
+def like_to_regex(pattern: str) -> re.Pattern:
+    """
+    Translates an SQL LIKE pattern to a regular expression that matches
+    the same strings as SQLite does: "%" matches any run of characters,
+    "_" matches one character and only ASCII letters ignore case.
+    :param pattern: LIKE pattern
+    :return: Compiled expression, to be used with fullmatch()
+    """
+    parts: list[str] = []
+    for char in pattern:
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        elif char.isascii() and char.isalpha():
+            parts.append(f'[{char.lower()}{char.upper()}]')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts), re.DOTALL)
+
+
+class SearchIndex:
+    """
+    Inverted index from normalized words to the events of a snapshot
+    """
+
+    def __init__(self, snapshot: Snapshot):
+        """
+        :param snapshot: Calendar snapshot to index
+        """
+        self.snapshot: Snapshot = snapshot
+        # (event_name, event_class) -> positions of the days it occurs on
+        events: dict[tuple[str, str], list[int]] = {}
+        for pos in range(len(snapshot)):
+            for event in snapshot.events(pos):
+                events.setdefault((event[1], event[0]), []).append(pos)
+        self.events: list[tuple[str, str]] = list(events)
+        self.days: list[list[int]] = list(events.values())
+        self.names: dict[str, list[int]] = {}
+        postings: dict[str, set[int]] = {}
+        for event_id, (name, _) in enumerate(self.events):
+            self.names.setdefault(name, []).append(event_id)
+            for token in tokenize(name):
+                postings.setdefault(token, set()).add(event_id)
+        self.tokens: list[str] = sorted(postings)
+        self.postings: list[set[int]] = [
+            postings[token] for token in self.tokens
+        ]
+        self.like = functools.lru_cache(maxsize=256)(self._like)
+        self.days_like = functools.lru_cache(maxsize=256)(self._days_like)
+
+    def _prefixed(self, prefix: str) -> set[int]:
+        matches: set[int] = set()
+        pos: int = bisect_left(self.tokens, prefix)
+        while pos < len(self.tokens) and self.tokens[pos].startswith(prefix):
+            matches |= self.postings[pos]
+            pos += 1
+        return matches
+
+    def search(self, query: str, limit: int = 50) -> list[SearchResult]:
+        """
+        Finds events containing every word of the query, as a whole word or
+        as the start of one. Events matching more words exactly and with
+        shorter names rank first.
+        :param query: Search text
+        :param limit: Maximum number of events returned
+        :return: Matching events with the days they occur on
+        """
+        words: list[str] = tokenize(query)
+        if not words:
+            return []
+        matches: set[int] = self._prefixed(words[0])
+        for word in words[1:]:
+            matches &= self._prefixed(word)
+            if not matches:
+                return []
+
+        def rank(event_id: int) -> tuple:
+            name_tokens: list[str] = tokenize(self.events[event_id][0])
+            return (
+                -sum(word in name_tokens for word in words),
+                len(name_tokens), -len(self.days[event_id]),
+                self.events[event_id]
+            )
+
+        return [
+            SearchResult(
+                self.events[event_id][0], self.events[event_id][1],
+                self.days[event_id]
+            )
+            for event_id in sorted(matches, key=rank)[:limit]
+        ]
+
+    def _like(self, pattern: str) -> tuple[str, ...]:
+        """
+        Event names matching an SQL LIKE pattern, cached as like()
+        :param pattern: LIKE pattern as used by the search query argument
+        :return: Matching names
+        """
+        expression: re.Pattern = like_to_regex(pattern)
+        return tuple(
+            name for name in self.names if expression.fullmatch(name)
+        )
+
+    def _days_like(self, pattern: str) -> tuple[int, ...]:
+        """
+        Days having an event whose name matches an SQL LIKE pattern, cached
+        as days_like()
+        :param pattern: LIKE pattern as used by the search query argument
+        :return: Sorted day positions in the snapshot
+        """
+        return tuple(sorted({
+            pos
+            for name in self.like(pattern)
+            for event_id in self.names[name]
+            for pos in self.days[event_id]
+        }))
@@ -0,0 +1,209 @@
+"""
+Compact columnar snapshot of the whole calendar.
+
+The file starts with a fixed header followed by fixed width columns, each
+aligned to 8 bytes so they can be used straight from a memory map:
+
+    id, ad_sn, bs_sn, tithi   int32 per day, tithi is a string id
+    event_start               uint32 per day + 1, offsets into the events
+    holiday                   uint8 per day
+    event_string              uint32 per event, string id
+    event_class               uint8 per event, index into EVENT_CLASSES
+    string_start              uint32 per string + 1, offsets into the blob
+    string blob               UTF-8 text of every interned string
+
+Days are sorted by AD serial, which keeps the BS serials sorted as well.
+"""
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Optional
+import struct
+import mmap
+import sys
+
+MAGIC: bytes = b'NPCALSNP'
+FORMAT_VERSION: int = 1
+HEADER: struct.Struct = struct.Struct('<8sBxxxIIIII')
+EVENT_CLASSES: tuple[str, ...] = ('event', 'panchangam')
+BYTE_ORDER: int = 0 if sys.byteorder == 'little' else 1
+
+
+class SnapshotException(Exception):
+    pass
+
+
+def _padding(size: int) -> bytes:
+    return b'\0' * (-size % 8)
+
+
+def write_snapshot(path: str,
+                   days: Iterable[tuple[int, int, int, bool, str,
+                                        list[tuple[str, str]]]]) -> int:
+    """
+    Writes a snapshot file
+    :param path: Output file path
+    :param days: (id, ad_sn, bs_sn, is_holiday, tithi, [(event_class,
+                 event_name), ...]) for every day, in any order
+    :return: Size of the written file in bytes
+    """
+    strings: dict[str, int] = {}
+
+    def intern(text: str) -> int:
+        if text not in strings:
+            strings[text] = len(strings)
+        return strings[text]
+
+    columns: dict[str, array] = {
+        'id': array('i'), 'ad_sn': array('i'), 'bs_sn': array('i'),
+        'tithi': array('i'), 'event_start': array('I', [0]),
+        'holiday': array('B'), 'event_string': array('I'),
+        'event_class': array('B'),
+    }
+    previous_bs_sn: int = -1
+    for day_id, ad_sn, bs_sn, is_holiday, tithi, events in sorted(
+            days, key=lambda day: day[1]):
+        if bs_sn <= previous_bs_sn:
+            raise SnapshotException(
+                f'BS serial {bs_sn} is out of order with AD serial {ad_sn}'
+            )
+        previous_bs_sn = bs_sn
+        columns['id'].append(day_id)
+        columns['ad_sn'].append(ad_sn)
+        columns['bs_sn'].append(bs_sn)
+        columns['holiday'].append(1 if is_holiday else 0)
+        columns['tithi'].append(-1 if tithi is None else intern(tithi))
+        for event_class, event_name in events:
+            columns['event_string'].append(intern(event_name))
+            columns['event_class'].append(EVENT_CLASSES.index(event_class))
+        columns['event_start'].append(len(columns['event_string']))
+
+    blob: bytearray = bytearray()
+    string_start: array = array('I', [0])
+    for text in strings:
+        blob += text.encode('utf-8')
+        string_start.append(len(blob))
+
+    sections: list[bytes] = [
+        columns[name].tobytes() for name in (
+            'id', 'ad_sn', 'bs_sn', 'tithi', 'event_start', 'holiday',
+            'event_string', 'event_class'
+        )
+    ] + [string_start.tobytes(), bytes(blob)]
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(
+            MAGIC, BYTE_ORDER, FORMAT_VERSION, len(columns['id']),
+            len(columns['event_string']), len(strings), len(blob)
+        ))
+        f.write(_padding(HEADER.size))
+        for section in sections:
+            f.write(section)
+            f.write(_padding(len(section)))
+        return f.tell()
+
+
+class Snapshot:
+    """
+    Read only view of a snapshot file. Nothing is parsed up front, columns
+    are memory mapped and shared between every process using the file.
+    """
+
+    def __init__(self, path: str):
+        """
+        Maps a snapshot file
+        :param path: Snapshot file path
+        """
+        with open(path, 'rb') as f:
+            self._map: mmap.mmap = mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        magic, byte_order, version, days, events, strings, blob_size = \
+            HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise SnapshotException(f'"{path}" is not a supported snapshot')
+        if byte_order != BYTE_ORDER:
+            raise SnapshotException(
+                f'"{path}" was written on a machine of different byte order'
+            )
+        view: memoryview = memoryview(self._map)
+        offset: int = HEADER.size + len(_padding(HEADER.size))
+
+        def column(fmt: str, count: int) -> memoryview:
+            nonlocal offset
+            size: int = struct.calcsize(fmt) * count
+            section: memoryview = view[offset:offset + size].cast(fmt)
+            offset += size + len(_padding(size))
+            return section
+
+        self.ids: memoryview = column('i', days)
+        self.ad_sn: memoryview = column('i', days)
+        self.bs_sn: memoryview = column('i', days)
+        self.tithi: memoryview = column('i', days)
+        self.event_start: memoryview = column('I', days + 1)
+        self.holiday: memoryview = column('B', days)
+        self.event_string: memoryview = column('I', events)
+        self.event_class: memoryview = column('B', events)
+        self.string_start: memoryview = column('I', strings + 1)
+        self._blob: memoryview = view[offset:offset + blob_size]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def string(self, string_id: int) -> str:
+        return str(
+            self._blob[
+                self.string_start[string_id]:self.string_start[string_id + 1]
+            ], 'utf-8'
+        )
+
+    def find(self, caltype: str, sn: int) -> Optional[int]:
+        """
+        Binary searches a day
+        :param caltype: Calendar system of the serial, 'ad' or 'bs'
+        :param sn: Date serial such as 20800101
+        :return: Position of the day or None
+        """
+        column: memoryview = self.ad_sn if caltype == 'ad' else self.bs_sn
+        pos: int = bisect_left(column, sn)
+        if pos < len(column) and column[pos] == sn:
+            return pos
+        return None
+
+    def day(self, pos: int) -> tuple:
+        """
+        :param pos: Position of the day
+        :return: The day as a tuple in calendar_index.CalendarDay field order
+        """
+        ad_sn: int = self.ad_sn[pos]
+        bs_sn: int = self.bs_sn[pos]
+        return (
+            self.ids[pos], ad_sn, bs_sn,
+            ad_sn // 10000, ad_sn // 100 % 100, ad_sn % 100,
+            bs_sn // 10000, bs_sn // 100 % 100, bs_sn % 100,
+            bool(self.holiday[pos])
+        )
+
+    def days(self) -> Iterator[tuple]:
+        return (self.day(pos) for pos in range(len(self)))
+
+    def events(self, pos: int) -> list[tuple[str, str]]:
+        """
+        Events of a day, tithi first, as (event_class, event_name)
+        :param pos: Position of the day
+        :return: Events in the order they were imported
+        """
+        events: list[tuple[str, str]] = []
+        if self.tithi[pos] >= 0:
+            events.append(('tithi', self.string(self.tithi[pos])))
+        for i in range(self.event_start[pos], self.event_start[pos + 1]):
+            events.append((
+                EVENT_CLASSES[self.event_class[i]],
+                self.string(self.event_string[i])
+            ))
+        return events
+
+    def close(self) -> None:
+        for name in ('ids', 'ad_sn', 'bs_sn', 'tithi', 'event_start',
+                     'holiday', 'event_string', 'event_class',
+                     'string_start', '_blob'):
+            getattr(self, name).release()
+        self._map.close()
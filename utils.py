@@ -1,132 +1,36 @@
-from datetime import datetime
+from typing import Iterator, Optional
 import argparse
-import json
 import sys
 import os
+from artifact_loader import ArtifactDay, ArtifactError, artifact_sources, merge_days, serial
+from export import EXTENSIONS, ExportOptions, Reiterable, buffered, emit, parse_event_types
+from snapshot import Snapshot
 
 
-NEP_ENG_NUMS: dict[str:str] = {
-    '०': '0',
-    '१': '1',
-    '२': '2',
-    '३': '3',
-    '४': '4',
-    '५': '5',
-    '६': '6',
-    '७': '7',
-    '८': '8',
-    '९': '9'
-    }
-MONTHS: list[str] = [
-    'january', 'february', 'march', 'april', 'may', 'june',
-    'july', 'august', 'september', 'october', 'november', 'december'
-    ]
-NEP_MONTHS: list[str] = [
-    'बैशाख', 'जेष्ठ', 'आषाढ़', 'श्रावण', 'भाद्र', 'आश्विन',
-    'कार्तिक', 'मंसिर', 'पौष', 'माघ', 'फाल्गुन', 'चैत्र'
-    ]
-
-Y: int = datetime.today().year
-M: int = datetime.today().month
-D: int = datetime.today().day
-
-KHOLIDAY_HEADER: str = f'''
-::
-:: Country:  Nepal
-::
-:: Language: Nepali
-::
-:: Author:   CausalSnek <contact@casualsnek.eu.org>
-::
-:: Updated:  {Y}-{M}-{D}
-::
-:: Source:   https://api.casualsnek.eu.org/nepcalev/2080
-::           https://github.com/casualsnek/nepcalev
-:: Metadata
-country     "NP"
-language    "np"
-name        "National events for Nepal"
-description "National events file for Nepal includes %EVENT_TYPES%"
-'''.strip()
-
-
-def nep_date_to_str(date: str) -> str:
+def snapshot_days(path: str) -> Iterator[ArtifactDay]:
     """
-    Converts nepali date to string
-    :param date: Date
-    :return:
+    Reads a calendar snapshot into the same days the artifact loader returns,
+    one day at a time from the memory mapped file
+    :param path: Snapshot file path
+    :return: Days sorted by english date
     """
-    date_parts: list = date.split('/')
-    nep_numeric_day: str = ''.join(
-        list(NEP_ENG_NUMS.keys())[int(num_char)] for num_char in date_parts[2]
-        )
-    nep_month_name: str = NEP_MONTHS[int(date_parts[1])-1]
-    nep_numeric_year: str = ''.join(
-        list(NEP_ENG_NUMS.keys())[int(num_char)] for num_char in date_parts[0]
-        )
-    return f'{nep_month_name} {nep_numeric_day}, {nep_numeric_year}'
-
-
-def get_kholiday_line(date: str, event_data: dict, event_types: list[str],
-                      out_dict: dict, append_bida: bool,
-                      append_panchangam: bool, flatten_holidays: bool) -> None:
-    """
-    Generates a line for kholiday entry
-    :param date: Date
-    :param event_data: Events data from artifact
-    :param event_types: Event types to keep
-    :param out_dict: The dictionary where the lines will be appended
-    :param append_bida: Add bida in front of holidays
-    :param append_panchangam: Add panchangam information
-    :param flatten_holidays: Merge all holidays in a day to one
-    :return:
-    """
-    month: str = MONTHS[int(date.split('/')[1])-1]
-    day: str = date.split('/')[2]
-    year: str = date.split('/')[0]
-    if 'holidays' in event_types:
-        if event_data['is_public_holiday']:
-            if flatten_holidays:
-                flat_events: str = '/'.join(
-                    event for event in event_data['events']
-                    )
-                out_dict[':: Public Holidays'].append(
-                    f'"{"सार्बजनिक बिदा: " if append_bida else ""}'
-                    f'{flat_events}" public on { month } { day } { year }'
-                    )
-            else:
-                for event in event_data['events']:
-                    out_dict[':: Public Holidays'].append(
-                        f'"{"सार्बजनिक बिदा: " if append_bida else ""}'
-                        f'{ event }" public on { month } { day } { year }'
-                        )
-
-    if 'non_holiday_events' in event_types:
-        if not event_data['is_public_holiday']:
-            for event in event_data['events']:
-                out_dict[':: Civil'].append(
-                    f'"{ event }" civil on { month } { day } { year }'
-                    )
-
-    if 'nepali_date' in event_types:
-        out_dict[':: Bikram Sambat Dates'].append(
-            f'"{ nep_date_to_str(event_data["nepali_date"]) }" '
-            f'nameday on { month } { day } { year }'
+    snapshot: Snapshot = Snapshot(path)
+    try:
+        for pos in range(len(snapshot)):
+            day: tuple = snapshot.day(pos)
+            tithi: str = ''
+            events: dict[str, list[str]] = {'event': [], 'panchangam': []}
+            for event_class, event_name in snapshot.events(pos):
+                if event_class == 'tithi':
+                    tithi = event_name
+                else:
+                    events[event_class].append(event_name)
+            yield ArtifactDay(
+                serial(*day[3:6]), serial(*day[6:9]), *day[3:9], bool(day[9]),
+                tithi, tuple(events['event']), tuple(events['panchangam'])
             )
-
-    if 'tithi' in event_types:
-        out_dict[':: Nepali Tithis'].append(
-            f'"{ event_data["tithi"]} " nameday on { month } { day } { year }'
-            )
-
-    if 'panchangam' in event_types:
-        for event in event_data['panchangam']:
-            out_dict[':: Panchangam'].append(
-                f'"{"पञ्चाङ्ग:" if append_panchangam else ""}'
-                f'{ event }" nameday on { month } { day } { year }'
-                )
-
-    return None
+    finally:
+        snapshot.close()
 
 
 if __name__ == '__main__':
@@ -143,9 +47,15 @@ if __name__ == '__main__':
         )
     parser.add_argument(
         '-k', '--geneout_dictrate-kholiday',
-        help='Generate kholiday holiday entry file from json artifact',
+        help='Generate holiday entry file from json artifact',
         action='store_true', dest='k'
         )
+    parser.add_argument(
+        '-f', '--format', dest='format',
+        help='Format of the generated file: kholiday, ics (iCalendar) or '
+        'csv. Use with "-k" flag',
+        choices=list(EXTENSIONS), default='kholiday'
+        )
     parser.add_argument(
         '-ah', '--append-holiday-info',
         help='Append "Sarbajanik Bida" in front of holiday events, '
@@ -168,6 +78,12 @@ if __name__ == '__main__':
         'Can be used multiple time to use multiple artifacts',
         required=False, action='append'
         )
+    parser.add_argument(
+        '-is', '--input-snapshot', dest='input_snapshot',
+        help='Calendar snapshot to use for generating kholiday data '
+        'instead of artifacts. Use with "-k" flag',
+        required=False
+        )
     parser.add_argument(
         '-se', '--select-events', dest='events',
         help='Event types to include while generating kholiday data. '
@@ -188,48 +104,68 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     if args.k:
-        print('[I] Kholiday file generation mode')
-        events = {}
+        print(f'[I] Holiday file generation mode, writing {args.format}')
+        snapshot_path: Optional[str] = None
 
-        for artifact in args.input_artifacts:
-            if not os.path.isfile(os.path.abspath(artifact)):
+        if args.input_snapshot is not None:
+            snapshot_path = os.path.abspath(args.input_snapshot)
+            if not os.path.isfile(snapshot_path):
+                print(
+                    f'[E] Input snapshot at '
+                    f'"{snapshot_path}" does not '
+                    f'exist. Terminating..'
+                    )
+                sys.exit(1)
+        artifact_paths: list[str] = [
+            os.path.abspath(artifact) for artifact in args.input_artifacts or []
+            ]
+        for artifact in artifact_paths:
+            if not os.path.isfile(artifact):
                 print(
                     f'[E] One of the input artifact at '
-                    f'"{os.path.abspath(artifact)}" does not exist. '
+                    f'"{artifact}" does not exist. '
                     f'Terminating..'
                     )
                 sys.exit(1)
-        for artifact in args.input_artifacts:
-            with open(os.path.abspath(artifact), 'r') as af:
-                events = {**events, **json.load(af)}
-        holiday_types: dict = {
-            ':: Public Holidays': [],
-            ':: Civil': [],
-            ':: Bikram Sambat Dates': [],
-            ':: Nepali Tithis': [],
-            ':: Panchangam': []
-        }
-        for eng_date in events:
-            get_kholiday_line(
-                eng_date, events[eng_date],
-                event_types=args.events.split(','),
-                out_dict=holiday_types,
+
+        def walk_days() -> Iterator[ArtifactDay]:
+            # Artifacts are parsed while the file is written, later inputs
+            # replace the days of earlier ones
+            return merge_days(
+                ([snapshot_days(snapshot_path)] if snapshot_path else [])
+                + artifact_sources(artifact_paths)
+                )
+        try:
+            options: ExportOptions = ExportOptions(
+                event_types=parse_event_types(args.events),
                 append_bida=args.ah,
                 append_panchangam=args.ap,
                 flatten_holidays=args.fh
                 )
+        except ValueError as e:
+            print(f'[E] {e}. Terminating..')
+            sys.exit(1)
         print('[I] Creating output directory !')
         os.makedirs(os.path.abspath(args.out_dir_holiday), exist_ok=True)
         FILE_PATH: str = os.path.join(
             os.path.abspath(args.out_dir_holiday),
             f'holiday_np_np@{"_".join(ev for ev in args.events.split(",") )}'
+            f'{EXTENSIONS[args.format]}'
             )
-        with open(FILE_PATH, 'w') as hf:
-            hf.write(KHOLIDAY_HEADER.replace(r'%EVENT_TYPES%', args.events))
-            for h_type in holiday_types:
-                hf.write(f'\n\n{h_type}')
-                for holiday in holiday_types[h_type]:
-                    hf.write(f'\n{holiday}')
-        print(f'[S] Kholiday file generated at "{FILE_PATH}" !')
-    if not args.a and not args.k:
+        try:
+            # Written as bytes, iCalendar and CSV files keep their CRLF line
+            # endings. kholiday files walk the days once per section
+            with open(FILE_PATH, 'wb') as hf:
+                for block in buffered(emit(
+                        args.format,
+                        Reiterable(walk_days) if args.format == 'kholiday' else walk_days(),
+                        options
+                        )):
+                    hf.write(block)
+        except ArtifactError as e:
+            os.remove(FILE_PATH)
+            print(f'[E] {e}. Terminating..')
+            sys.exit(1)
+        print(f'[S] Holiday file generated at "{FILE_PATH}" !')
+    if not args.k:
         parser.print_help(sys.stderr)
@@ -0,0 +1,115 @@
+"""
+Optional NumPy query engine. Evaluates the same filters as the SQL query
+built by calender_query_builder as boolean masks over the columns of a
+calendar snapshot, which is much faster for multi year ranges.
+"""
+from functools import lru_cache
+import re
+
+from snapshot import Snapshot
+from search import like_to_regex
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+class VectorEngine:
+    """
+    Query engine over the memory mapped columns of a snapshot
+    """
+
+    def __init__(self, snapshot: Snapshot):
+        """
+        :param snapshot: Calendar snapshot to query
+        """
+        if np is None:
+            raise RuntimeError('The numpy query engine requires numpy')
+        self.snapshot: Snapshot = snapshot
+        days: int = len(snapshot)
+        self.ids = np.frombuffer(snapshot.ids, dtype=np.int32)
+        self.serials: dict = {
+            'ad': np.frombuffer(snapshot.ad_sn, dtype=np.int32),
+            'bs': np.frombuffer(snapshot.bs_sn, dtype=np.int32),
+        }
+        self.parts: dict = {}
+        for caltype, serial in self.serials.items():
+            self.parts[(caltype, 'year')] = serial // 10000
+            self.parts[(caltype, 'month')] = serial // 100 % 100
+            self.parts[(caltype, 'day')] = serial % 100
+        self.holiday = np.frombuffer(snapshot.holiday, dtype=np.uint8) != 0
+        self.tithi = np.frombuffer(snapshot.tithi, dtype=np.int32)
+        event_counts = np.diff(
+            np.frombuffer(snapshot.event_start, dtype=np.uint32)
+            .astype(np.int64)
+        )
+        # Events are stored per day back to back, remember each one's day
+        self.event_day = np.repeat(np.arange(days), event_counts)
+        self.event_string = np.frombuffer(
+            snapshot.event_string, dtype=np.uint32
+        )
+        # The SQL query joins on relations, days without any never match
+        self.has_events = (self.tithi >= 0) | (event_counts > 0)
+        self.strings: list[str] = [
+            snapshot.string(string_id)
+            for string_id in range(len(snapshot.string_start) - 1)
+        ]
+        self.string_ids: dict[str, int] = {
+            text: string_id for string_id, text in enumerate(self.strings)
+        }
+        self.like = lru_cache(maxsize=256)(self._like)
+
+    def _like(self, pattern: str):
+        expression: re.Pattern = like_to_regex(pattern)
+        return np.array([
+            string_id for string_id, text in enumerate(self.strings)
+            if expression.fullmatch(text)
+        ], dtype=np.int64)
+
+    def select(self, query) -> list[int]:
+        """
+        Finds the days matching a query
+        :param query: Validated query as returned by parse_calendar_query
+        :return: Positions of matching days in the snapshot, ordered by id
+        """
+        mask = self.has_events.copy()
+        if query.sn_range is not None:
+            serial = self.serials[query.caltype]
+            mask &= (serial >= query.sn_range[0]) & \
+                (serial <= query.sn_range[1])
+        for part in ('year', 'month', 'day'):
+            if getattr(query, part) != 0:
+                mask &= self.parts[(query.caltype, part)] == \
+                    getattr(query, part)
+        if query.only_holidays:
+            mask &= self.holiday
+        if query.except_holidays:
+            mask &= ~self.holiday
+        search: bool = query.search_event.strip() != ''
+        if query.filter_tithis or search:
+            # Like the SQL join, a single event has to pass every filter
+            tithi_match = self.tithi >= 0
+            event_match = np.ones(len(self.event_string), dtype=bool)
+            if query.filter_tithis:
+                tithi_match &= np.isin(self.tithi, [
+                    self.string_ids[name] for name in query.filter_tithis
+                    if name in self.string_ids
+                ])
+                event_match[:] = False
+            if search:
+                matches = self.like(query.search_event)
+                tithi_match &= np.isin(self.tithi, matches)
+                event_match &= np.isin(self.event_string, matches)
+                tithi_match |= np.bincount(
+                    self.event_day[event_match], minlength=len(mask)
+                ) > 0
+            mask &= tithi_match
+        positions = np.flatnonzero(mask)
+        return positions[
+            np.argsort(self.ids[positions], kind='stable')
+        ].tolist()